@@ -223,11 +223,35 @@ def display_api_keys():
         api_keys = st.session_state.api_keys
         
         if api_keys:
+            concurrency = st.session_state.generator.api_client.get_concurrency_status()
+            
             for i, key in enumerate(api_keys):
                 masked_key = f"{key[:6]}...{key[-4:]}" if len(key) > 10 else "Invalid key format"
-                st.code(f"Key {i+1}: {masked_key}")
+                
+                # Show key health (success rate, latency, quarantine) next to each key
+                health = st.session_state.generator.api_client.key_health.get_status(key)
+                if health["quarantined"]:
+                    status = f"quarantined for {health['quarantine_remaining'] // 60} min ({health['last_error']})"
+                else:
+                    status = f"healthy, {health['success_rate']:.0%} success"
+                    if health["latency"] is not None:
+                        status += f", {health['latency']:.1f}s avg"
+                    if concurrency and key in concurrency["keys"]:
+                        status += f", {concurrency['keys'][key]:.1f} concurrent"
+                
+                # Remaining daily capacity per model, from the usage ledger
+                usage = st.session_state.generator.api_client.quota_ledger.get_status(key)
+                for model, model_usage in sorted(usage.items()):
+                    if model_usage["remaining_requests"] is not None:
+                        status += f"\n  {model}: {model_usage['remaining_requests']} requests left today"
+                    else:
+                        status += f"\n  {model}: {model_usage['requests']} requests today"
+                    status += f" ({model_usage['tokens']:,} tokens used)"
+                st.code(f"Key {i+1}: {masked_key} - {status}")
             
             st.success(f"✅ {len(api_keys)} API key(s) loaded successfully")
+            if concurrency:
+                st.info(f"Adaptive concurrency: up to {concurrency['global']:.1f} requests in flight across all keys")
         else:
             st.warning("⚠️ No API keys found. Please add your API keys below.")
         
@@ -450,6 +474,12 @@ def display_generate_articles():
                     index=0
                 )
                 
+                parallel_processing = st.checkbox(
+                    "Generate articles in parallel across API keys",
+                    value=True,
+                    help="Runs several articles at once, up to one per API key. Disable to process subjects one at a time."
+                )
+                
                 # Start batch processing button
                 if st.button("🚀 Start Batch Processing", type="primary", use_container_width=True):
                     # Show progress
@@ -463,36 +493,67 @@ def display_generate_articles():
                     # Set up the generator with current API keys
                     st.session_state.generator.api_keys = st.session_state.api_keys
                     
-                    for idx, subject in enumerate(subjects):
-                        try:
-                            # Update progress
-                            progress = int((idx / len(subjects)) * 100)
-                            progress_placeholder.progress(progress)
-                            status_text.text(f"Processing {idx+1}/{len(subjects)}: {subject}")
-                            
-                            # Generate the article
-                            result = st.session_state.generator.generate_seo_article(
-                                subject=subject,
-                                domain=domain,
-                                model_title=model_choice,
-                                model_article=model_choice,
-                                category=category,
-                                publisher=publisher
-                            )
-                            
-                            batch_results.append({
-                                "subject": subject,
-                                "title": result["title"],
-                                "permalink": result["permalink"],
-                                "file_path": result["file_path"]
-                            })
-                            
-                            # Display incremental results
-                            article_results.markdown(f"✅ **Generated ({idx+1}/{len(subjects)}):** {result['title']}")
+                    if parallel_processing:
+                        completed = []
+                        
+                        def on_article_done(idx, subject, result, error):
+                            completed.append(idx)
+                            progress_placeholder.progress(int((len(completed) / len(subjects)) * 100))
+                            status_text.text(f"Completed {len(completed)}/{len(subjects)} articles")
                             
-                        except Exception as e:
-                            errors.append({"subject": subject, "error": str(e)})
-                            article_results.markdown(f"❌ **Error with \"{subject}\":** {str(e)}")
+                            if error:
+                                errors.append({"subject": subject, "error": error})
+                                article_results.markdown(f"❌ **Error with \"{subject}\":** {error}")
+                            else:
+                                batch_results.append({
+                                    "subject": subject,
+                                    "title": result["title"],
+                                    "permalink": result["permalink"],
+                                    "file_path": result["file_path"]
+                                })
+                                article_results.markdown(f"✅ **Generated ({len(completed)}/{len(subjects)}):** {result['title']}")
+                        
+                        status_text.text(f"Processing {len(subjects)} subjects in parallel...")
+                        st.session_state.generator.generate_seo_articles(
+                            subjects,
+                            domain=domain,
+                            model_title=model_choice,
+                            model_article=model_choice,
+                            category=category,
+                            publisher=publisher,
+                            result_callback=on_article_done
+                        )
+                    else:
+                        for idx, subject in enumerate(subjects):
+                            try:
+                                # Update progress
+                                progress = int((idx / len(subjects)) * 100)
+                                progress_placeholder.progress(progress)
+                                status_text.text(f"Processing {idx+1}/{len(subjects)}: {subject}")
+                                
+                                # Generate the article
+                                result = st.session_state.generator.generate_seo_article(
+                                    subject=subject,
+                                    domain=domain,
+                                    model_title=model_choice,
+                                    model_article=model_choice,
+                                    category=category,
+                                    publisher=publisher
+                                )
+                                
+                                batch_results.append({
+                                    "subject": subject,
+                                    "title": result["title"],
+                                    "permalink": result["permalink"],
+                                    "file_path": result["file_path"]
+                                })
+                                
+                                # Display incremental results
+                                article_results.markdown(f"✅ **Generated ({idx+1}/{len(subjects)}):** {result['title']}")
+                                
+                            except Exception as e:
+                                errors.append({"subject": subject, "error": str(e)})
+                                article_results.markdown(f"❌ **Error with \"{subject}\":** {str(e)}")
                     
                     # Complete the progress
                     progress_placeholder.progress(100)
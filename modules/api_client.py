@@ -1,11 +1,66 @@
+import re
+import json
+import hashlib
 import requests
 import time
 import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from modules.rate_limiter import RateLimiter
+from modules.key_health import KeyHealthTracker
+from modules.quota_ledger import QuotaLedger
+from modules.concurrency_limiter import ConcurrencyLimiter
+from modules.http_transport import get_transport
+from modules.disk_cache import DiskCache
+from modules.model_router import ModelRouter
+from modules.settings import (
+    GEMINI_API_BASE, REQUESTS_PER_KEY, ADAPTIVE_CONCURRENCY, WAIT_TIME_BETWEEN_REQUESTS,
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_FILE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BYTES,
+    HEDGING_ENABLED, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES, HEDGE_MAX_EXTRA_RATIO, HEDGE_HISTORY_SIZE, HEDGE_MAX_WORKERS,
+    KEY_QUARANTINE_MAX_WAIT
+)
 
 class GeminiClient:
-    def __init__(self, api_keys=None):
+    def __init__(self, api_keys=None, requests_per_key=REQUESTS_PER_KEY):
         self.api_keys = api_keys or []
         self.current_key_index = 0
+        self.requests_per_key = max(1, requests_per_key)
+        
+        # In-flight request counts per key, guarded by a condition so callers can wait for a free slot
+        self._key_condition = threading.Condition()
+        self._in_flight = {}
+        
+        # AIMD windows per key and for the whole pool, replacing the fixed requests_per_key when enabled
+        self.concurrency = ConcurrencyLimiter(self.requests_per_key) if ADAPTIVE_CONCURRENCY else None
+        
+        # Per-key, per-model RPM/TPM buckets replace fixed sleeps between requests
+        self.rate_limiter = RateLimiter()
+        
+        # Success rate, latency and quarantine state per key, persisted across restarts
+        self.key_health = KeyHealthTracker()
+        
+        # Daily requests and tokens per key, so keys are drained evenly and skipped before they hit 429
+        self.quota_ledger = QuotaLedger()
+        
+        # Pooled keep-alive connections to the Gemini endpoint
+        self.transport = get_transport()
+        
+        # On-disk cache of responses, so reruns and resumed batches don't spend quota again
+        self.cache_enabled = RESPONSE_CACHE_ENABLED
+        self.response_cache = DiskCache(RESPONSE_CACHE_FILE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BYTES) if RESPONSE_CACHE_ENABLED else None
+        
+        # Latency, error rate and quota state per model, used to pick the model chain for each stage
+        self.model_router = ModelRouter()
+        
+        # Hedging: recent latencies per (model, prompt size) and how much extra quota hedges have used
+        self.hedging_enabled = HEDGING_ENABLED
+        self._latencies = {}
+        self._request_total = 0
+        self._hedge_total = 0
+        self._hedges_running = 0
+        self._hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS)
     
     def switch_key(self):
         """
@@ -14,7 +69,11 @@ class GeminiClient:
         if not self.api_keys:
             raise Exception("No API keys available")
         
-        self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
+        # Move to the next key that isn't quarantined (or simply the next key if all are)
+        for _ in range(len(self.api_keys)):
+            self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
+            if self.key_health.is_available(self.api_keys[self.current_key_index]):
+                break
         return self.api_keys[self.current_key_index]
     
     def get_current_key(self):
@@ -26,107 +85,660 @@ class GeminiClient:
         
         return self.api_keys[self.current_key_index]
     
-    def send_request(self, prompt, model="gemini-1.5-flash", max_retries=5):
+    def get_max_concurrency(self):
+        """
+        Get the total number of requests that can be in flight across the key pool
+        (the upper bound of the adaptive windows when adaptive concurrency is on)
+        """
+        if self.concurrency:
+            return self.concurrency.get_max_concurrency(len(self.api_keys))
+        return max(1, len(self.api_keys) * self.requests_per_key)
+    
+    def get_key_limit(self, api_key):
+        """
+        Get the number of requests currently allowed in flight on a key
+        """
+        if self.concurrency:
+            return self.concurrency.get_key_limit(api_key)
+        return self.requests_per_key
+    
+    def get_concurrency_status(self):
+        """
+        Get the current adaptive windows (global and per key), or None if adaptive concurrency is off
+        """
+        if not self.concurrency:
+            return None
+        return self.concurrency.get_status(self.api_keys)
+    
+    def has_quota(self, model, tokens=0):
+        """
+        Check whether any usable key is projected to have daily quota left for a model
+        """
+        with self._key_condition:
+            return any(
+                self.key_health.is_available(api_key)
+                and not self.quota_ledger.is_exhausted(api_key, model, tokens, self._in_flight.get(api_key, 0))
+                for api_key in self.api_keys
+            )
+    
+    def _select_key_locked(self, model, tokens, exclude=None, idle_only=False):
+        """
+        Pick the index of the best key for a request, or None if no key has a free slot
+        (or every key is quarantined). Must be called with _key_condition held.
+        """
+        key_count = len(self.api_keys)
+        available_indexes = [
+            index for index in range(key_count)
+            if self.key_health.is_available(self.api_keys[index])
+        ]
+        if not available_indexes:
+            return None
+        
+        # Skip keys projected to run out of today's quota for this model
+        if model:
+            available_indexes = [
+                index for index in available_indexes
+                if not self.quota_ledger.is_exhausted(
+                    self.api_keys[index], model, tokens, self._in_flight.get(self.api_keys[index], 0)
+                )
+            ]
+            if not available_indexes and not idle_only:
+                raise Exception(f"All API keys have used their daily quota for {model}. Check the API Keys page or add new keys.")
+        
+        # The pool as a whole is at its adaptive limit
+        if self.concurrency and sum(self._in_flight.values()) >= self.concurrency.get_global_limit(key_count):
+            return None
+        
+        best_index = None
+        best_rank = None
+        for index in available_indexes:
+            api_key = self.api_keys[index]
+            if api_key == exclude:
+                continue
+            
+            in_flight = self._in_flight.get(api_key, 0)
+            if in_flight >= self.get_key_limit(api_key) or (idle_only and in_flight > 0):
+                continue
+            
+            wait_time = self.rate_limiter.wait_time(api_key, model, tokens) if model else 0
+            if idle_only and wait_time > 0:
+                continue
+            
+            # Prefer the key with the most quota left so keys run out evenly
+            remaining = self.quota_ledger.get_remaining(api_key, model) if model else 1.0
+            
+            offset = (index - self.current_key_index) % key_count
+            rank = (wait_time, -round(remaining, 1), -round(self.key_health.get_score(api_key), 1), offset)
+            if best_rank is None or rank < best_rank:
+                best_index, best_rank = index, rank
+        
+        return best_index
+    
+    def _reserve_key_locked(self, index):
+        api_key = self.api_keys[index]
+        self._in_flight[api_key] = self._in_flight.get(api_key, 0) + 1
+        self.current_key_index = (index + 1) % len(self.api_keys)
+        return api_key
+    
+    def acquire_key(self, model=None, tokens=0):
+        """
+        Reserve a request slot on an API key with spare capacity.
+        Quarantined keys and keys projected to be out of daily quota are skipped. Among the rest,
+        keys whose rate limit allows an immediate request come first, then the keys with the most
+        daily quota left, then the healthiest keys, then round-robin order.
+        Blocks if every usable key is busy, or until the first key leaves quarantine if every key
+        is quarantined (failing instead if that is more than KEY_QUARANTINE_MAX_WAIT away).
+        """
+        with self._key_condition:
+            while True:
+                if not self.api_keys:
+                    raise Exception("No API keys available")
+                
+                index = self._select_key_locked(model, tokens)
+                if index is not None:
+                    return self._reserve_key_locked(index)
+                
+                quarantine_wait = min(self.key_health.get_available_at(api_key) for api_key in self.api_keys) - time.time()
+                if quarantine_wait > KEY_QUARANTINE_MAX_WAIT:
+                    raise Exception("All API keys are quarantined. Check the API Keys page or add new keys.")
+                elif quarantine_wait > 0:
+                    # Every key is quarantined, wait for the first one to come back
+                    self._key_condition.wait(quarantine_wait)
+                elif self._in_flight:
+                    # Usable keys have no free slot, wait for one to be released
+                    self._key_condition.wait()
+    
+    def release_key(self, api_key):
+        """
+        Release a request slot previously reserved with acquire_key
+        """
+        with self._key_condition:
+            if self._in_flight.get(api_key, 0) > 1:
+                self._in_flight[api_key] -= 1
+            else:
+                self._in_flight.pop(api_key, None)
+            self._key_condition.notify_all()
+    
+    def _get_retry_after(self, response):
+        """
+        Get the delay (in seconds) a 429 response asks us to wait, or None if it doesn't say
+        """
+        if response is None:
+            return None
+        
+        # Standard Retry-After header
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        
+        # Gemini reports the delay as RetryInfo in the error body, e.g. "retryDelay": "37s"
+        try:
+            for detail in response.json().get("error", {}).get("details", []):
+                match = re.match(r'^(\d+(?:\.\d+)?)s$', str(detail.get("retryDelay", "")))
+                if match:
+                    return float(match.group(1))
+        except Exception:
+            pass
+        
+        return None
+    
+    def build_request_data(self, prompt, generation_config=None):
+        """
+        Build the generateContent request body for a prompt.
+        generation_config entries (e.g. responseMimeType) override the defaults.
+        """
+        data = {
+            "contents": [
+                {
+                    "parts": [
+                        {
+                            "text": prompt
+                        }
+                    ]
+                }
+            ],
+            "generationConfig": {
+                "temperature": 0.7,
+                "topK": 40,
+                "topP": 0.95,
+                "maxOutputTokens": 8192,
+                "stopSequences": []
+            },
+            "safetySettings": [
+                {
+                    "category": "HARM_CATEGORY_HARASSMENT",
+                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+                },
+                {
+                    "category": "HARM_CATEGORY_HATE_SPEECH",
+                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+                },
+                {
+                    "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+                },
+                {
+                    "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+                }
+            ]
+        }
+        
+        if generation_config:
+            data["generationConfig"].update(generation_config)
+        
+        return data
+    
+    def get_cache_key(self, model, data):
+        """
+        Get the response cache key for a request: a hash of the model, prompt and generationConfig
+        """
+        cache_source = json.dumps({
+            "model": model,
+            "contents": data["contents"],
+            "generationConfig": data["generationConfig"]
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(cache_source.encode('utf-8')).hexdigest()
+    
+    def _get_cached_response(self, model, data, use_cache):
+        if not (use_cache and self.cache_enabled and self.response_cache):
+            return None, None
+        
+        cache_key = self.get_cache_key(model, data)
+        return cache_key, self.response_cache.get(cache_key)
+    
+    def _attempt_request(self, api_key, model, data, estimated_tokens, latency_key, sending=None):
+        """
+        Make a single generateContent request on a key already reserved with acquire_key.
+        Returns the response text, or None if the response had no candidates.
+        Updates rate limits and key health, and always releases the key slot.
+        sending (a threading.Event) is set once the rate limiter lets the request go out.
+        """
+        url = f"{GEMINI_API_BASE}/models/{model}:generateContent?key={api_key}"
+        
+        headers = {
+            "Content-Type": "application/json"
+        }
+        sent_at = time.monotonic()
+        
+        try:
+            # Wait until the key's bucket has room for this request
+            self.rate_limiter.acquire(api_key, model, estimated_tokens)
+            sent_at = time.monotonic()
+            
+            with self._key_condition:
+                self._request_total += 1
+            if sending:
+                sending.set()
+            
+            start_time = time.time()
+            response = self.transport.post(url, kind="gemini", headers=headers, json=data)
+            response.raise_for_status()
+            response_json = response.json()
+            latency = time.time() - start_time
+            
+            # Charge the tokens the request actually used (prompt + output)
+            usage = response_json.get("usageMetadata", {})
+            if usage.get("totalTokenCount"):
+                self.rate_limiter.record_tokens(api_key, model, usage["totalTokenCount"] - estimated_tokens)
+            self.quota_ledger.record_usage(api_key, model, usage.get("totalTokenCount", estimated_tokens))
+            
+            if "candidates" in response_json and len(response_json["candidates"]) > 0:
+                text = response_json["candidates"][0]["content"]["parts"][0]["text"]
+                self.key_health.record_success(api_key, latency)
+                self.model_router.record_success(model, latency)
+                self._record_window_success(api_key, latency, latency_key)
+                self._record_latency(latency_key, latency)
+                return text
+            
+            self.key_health.record_failure(api_key, None, "Empty response")
+            self.model_router.record_failure(model, None, "Empty response")
+            return None
+        
+        except requests.exceptions.HTTPError as e:
+            status_code = e.response.status_code if e.response is not None else None
+            error_text = e.response.text if e.response is not None else str(e)
+            self.key_health.record_failure(api_key, status_code, error_text)
+            
+            # Invalid or revoked keys say nothing about the model itself
+            if status_code not in (400, 401, 403):
+                self.model_router.record_failure(model, status_code, error_text)
+            
+            # Handle rate limiting specifically
+            if status_code == 429 or ("429" in str(e) and "Too Many Requests" in str(e)):
+                # Pause this key for as long as the server asks
+                self.rate_limiter.penalize(api_key, model, self._get_retry_after(e.response))
+                if "per day" in error_text.lower():
+                    self.quota_ledger.mark_exhausted(api_key, model)
+            
+            if status_code == 429 or (status_code or 0) >= 500:
+                self._record_overload(api_key, sent_at, status_code)
+            raise
+        
+        except Exception as e:
+            # Network errors and timeouts are about this key's connection, not the model
+            self.key_health.record_failure(api_key, None, str(e))
+            
+            if isinstance(e, requests.exceptions.Timeout):
+                self._record_overload(api_key, sent_at)
+            raise
+        
+        finally:
+            self.release_key(api_key)
+    
+    def _record_window_success(self, api_key, latency, latency_key=None):
+        """
+        Widen the adaptive windows, unless the response was slower than the usual hedge threshold
+        (a sign the key or endpoint is getting saturated)
+        """
+        if not self.concurrency:
+            return
+        
+        threshold = self.get_hedge_delay(latency_key) if latency_key else None
+        if threshold is None or latency <= threshold:
+            self.concurrency.record_success(api_key, len(self.api_keys))
+    
+    def _record_overload(self, api_key, sent_at, status_code=None):
+        """
+        Halve the adaptive windows after a 429, 5xx or timeout. A 429 is one key's rate limit,
+        so only that key's window shrinks; 5xx and timeouts shrink the pool's window as well.
+        """
+        if self.concurrency:
+            self.concurrency.record_overload(api_key, len(self.api_keys), sent_at, server_overload=status_code != 429)
+    
+    def _record_latency(self, latency_key, latency):
+        with self._key_condition:
+            if latency_key not in self._latencies:
+                self._latencies[latency_key] = deque(maxlen=HEDGE_HISTORY_SIZE)
+            self._latencies[latency_key].append(latency)
+    
+    def get_hedge_delay(self, latency_key):
+        """
+        Get how long to wait before hedging a request: the configured percentile of recent
+        latencies for the same model and prompt size, or None while there is too little history
+        """
+        with self._key_condition:
+            history = sorted(self._latencies.get(latency_key, []))
+        
+        if len(history) < HEDGE_MIN_SAMPLES:
+            return None
+        return history[min(len(history) - 1, int(len(history) * HEDGE_PERCENTILE))]
+    
+    def _acquire_hedge_key(self, model, tokens, exclude):
+        """
+        Reserve an idle key (no requests in flight, quota available now) for a hedge request,
+        or return None if there is none or the hedging budget is used up. The budget limits both
+        the hedges sent and the hedged pairs still running: the losing request of a pair can't be
+        interrupted, so it keeps using a slot until it returns.
+        """
+        with self._key_condition:
+            if self._hedge_total + 1 > self._request_total * HEDGE_MAX_EXTRA_RATIO:
+                return None
+            if self._hedges_running >= max(1, int(self.get_max_concurrency() * HEDGE_MAX_EXTRA_RATIO)):
+                return None
+            
+            try:
+                index = self._select_key_locked(model, tokens, exclude=exclude, idle_only=True)
+            except Exception:
+                return None
+            
+            if index is None:
+                return None
+            
+            self._hedge_total += 1
+            self._hedges_running += 1
+            return self._reserve_key_locked(index)
+    
+    def _hedge_finished(self, futures):
+        """
+        Count a hedged pair as running until both of its requests have returned
+        """
+        remaining = [len(futures)]
+        
+        def finished(_):
+            with self._key_condition:
+                remaining[0] -= 1
+                if not remaining[0]:
+                    self._hedges_running -= 1
+        
+        for future in futures:
+            future.add_done_callback(finished)
+    
+    def _send_hedged(self, api_key, model, data, estimated_tokens, latency_key):
+        """
+        Run a request, and if it is slower than usual send a duplicate on another idle key.
+        Whichever succeeds first wins. The slower request can't be interrupted mid-flight,
+        so its result is simply discarded and its key slot freed when it returns.
+        The delay is counted from when the request is actually sent, not from when it was queued
+        on the hedging threads or held back by the rate limiter.
+        """
+        delay = self.get_hedge_delay(latency_key)
+        if delay is None:
+            return self._attempt_request(api_key, model, data, estimated_tokens, latency_key)
+        
+        sending = threading.Event()
+        primary = self._hedge_executor.submit(self._attempt_request, api_key, model, data, estimated_tokens, latency_key, sending)
+        primary.add_done_callback(lambda _: sending.set())
+        sending.wait()
+        
+        try:
+            return primary.result(timeout=delay)
+        except FuturesTimeoutError:
+            pass
+        
+        hedge_key = self._acquire_hedge_key(model, estimated_tokens, api_key)
+        if hedge_key is None:
+            return primary.result()
+        
+        hedge = self._hedge_executor.submit(self._attempt_request, hedge_key, model, data, estimated_tokens, latency_key)
+        self._hedge_finished([primary, hedge])
+        
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    text = future.result()
+                except Exception as e:
+                    first_error = first_error or e
+                    continue
+                
+                if text is not None:
+                    for other in pending:
+                        other.cancel()
+                    return text
+        
+        if first_error:
+            raise first_error
+        return None
+    
+    def send_request(self, prompt, model="gemini-1.5-flash", max_retries=5, use_cache=True, generation_config=None,
+                     stage=None):
         """
-        Send a request to the Gemini API
+        Send a request to the Gemini API.
+        The model router picks the models to try for the stage ("title", "article", ...): the
+        requested model first, then the stage's fallback chain. A model is abandoned early once
+        the router marks it as degraded.
+        Identical requests to the same model are answered from the response cache unless use_cache
+        is False (a fallback model's earlier answer isn't reused for the requested model).
         """
+        data = self.build_request_data(prompt, generation_config)
+        
+        _, cached = self._get_cached_response(model, data, use_cache)
+        if cached is not None:
+            return cached
+        
+        chain = self.model_router.get_chain(stage, model)
         if not self.api_keys:
             raise Exception("No API keys available. Please add your API key.")
         
+        for position, chain_model in enumerate(chain):
+            has_fallback = position < len(chain) - 1
+            text = self._send_with_retries(prompt, chain_model, data, max_retries, has_fallback)
+            if text is not None:
+                # Cached under the model that actually answered
+                if use_cache and self.cache_enabled and self.response_cache:
+                    self.response_cache.set(self.get_cache_key(chain_model, data), text)
+                return text
+            
+            if has_fallback:
+                print(f"Model {chain_model} failed, switching to {chain[position + 1]}")
+        
+        # If we've exhausted all retries and every model in the chain failed
+        raise Exception(f"Failed to get response after {max_retries} attempts with different API keys")
+    
+    def _send_with_retries(self, prompt, model, data, max_retries, has_fallback):
+        """
+        Try a request on one model, moving to the next key after each failure.
+        Returns the text, or None when retries run out or the model is degraded and
+        another model can take over.
+        """
         retry_count = 0
         
+        # Rough prompt size in tokens, corrected with the real usage once the response arrives
+        estimated_tokens = len(prompt) // 4
+        latency_key = (model, len(prompt).bit_length())
+        
         while retry_count < max_retries:
-            # Set up API request
-            api_key = self.get_current_key()
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
+            # Don't wait out the remaining retries on a model the router has given up on
+            if retry_count > 0 and has_fallback and self.model_router.is_degraded(model):
+                return None
+            
+            # Every key is out of today's quota for this model, let the next model take over
+            if has_fallback and not self.has_quota(model, estimated_tokens):
+                return None
+            
+            # Reserve a slot on the key whose rate limit frees up first
+            api_key = self.acquire_key(model, estimated_tokens)
+            
+            try:
+                if self.hedging_enabled:
+                    text = self._send_hedged(api_key, model, data, estimated_tokens, latency_key)
+                else:
+                    text = self._attempt_request(api_key, model, data, estimated_tokens, latency_key)
+                
+                if text is not None:
+                    return text
+                
+                # No valid response, retry on the next key
+                retry_count += 1
+            
+            except requests.exceptions.HTTPError:
+                # Key health and rate limits were already updated, just retry on the next key
+                retry_count += 1
+            
+            except Exception:
+                # Network failure, wait briefly before retrying on the next key
+                time.sleep(WAIT_TIME_BETWEEN_REQUESTS)
+                retry_count += 1
+        
+        return None
+    
+    def send_batch(self, prompts, model="gemini-1.5-flash", max_retries=5, max_workers=None, use_cache=True,
+                   generation_config=None, stage=None):
+        """
+        Send several prompts concurrently across the API key pool.
+        Returns one {"text", "error"} dict per prompt, in the same order as the prompts.
+        """
+        if not self.api_keys:
+            raise Exception("No API keys available. Please add your API key.")
+        
+        results = [None] * len(prompts)
+        if not prompts:
+            return results
+        
+        workers = max_workers or self.get_max_concurrency()
+        with ThreadPoolExecutor(max_workers=min(workers, len(prompts))) as executor:
+            futures = {
+                executor.submit(self.send_request, prompt, model, max_retries, use_cache, generation_config, stage): index
+                for index, prompt in enumerate(prompts)
+            }
+            
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    results[index] = {"text": future.result(), "error": None}
+                except Exception as e:
+                    results[index] = {"text": None, "error": str(e)}
+        
+        return results
+    
+    def stream_request(self, prompt, model="gemini-1.5-flash", max_retries=5, use_cache=True, generation_config=None):
+        """
+        Send a request to the Gemini streaming endpoint and yield text chunks as they arrive.
+        Failures before the first chunk are retried on other keys like send_request;
+        a failure after text has been yielded is raised, since the caller already consumed part of it.
+        A cached response is yielded as a single chunk.
+        """
+        cache_key, cached = self._get_cached_response(model, self.build_request_data(prompt, generation_config), use_cache)
+        if cached is not None:
+            yield cached
+            return
+        
+        if not self.api_keys:
+            raise Exception("No API keys available. Please add your API key.")
+        
+        retry_count = 0
+        estimated_tokens = len(prompt) // 4
+        latency_key = (model, len(prompt).bit_length())
+        
+        while retry_count < max_retries:
+            api_key = self.acquire_key(model, estimated_tokens)
+            url = f"{GEMINI_API_BASE}/models/{model}:streamGenerateContent?alt=sse&key={api_key}"
             
             headers = {
                 "Content-Type": "application/json"
             }
             
-            data = {
-                "contents": [
-                    {
-                        "parts": [
-                            {
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ],
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "topK": 40,
-                    "topP": 0.95,
-                    "maxOutputTokens": 8192,
-                    "stopSequences": []
-                },
-                "safetySettings": [
-                    {
-                        "category": "HARM_CATEGORY_HARASSMENT",
-                        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                    },
-                    {
-                        "category": "HARM_CATEGORY_HATE_SPEECH",
-                        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                    },
-                    {
-                        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                    },
-                    {
-                        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                    }
-                ]
-            }
+            data = self.build_request_data(prompt, generation_config)
+            yielded_text = False
+            streamed_parts = []
+            
+            sent_at = time.monotonic()
             
             try:
-                response = requests.post(url, headers=headers, json=data, timeout=120)
+                self.rate_limiter.acquire(api_key, model, estimated_tokens)
+                sent_at = time.monotonic()
+                
+                with self._key_condition:
+                    self._request_total += 1
+                
+                start_time = time.time()
+                response = self.transport.post(url, kind="gemini", headers=headers, json=data, stream=True)
                 response.raise_for_status()
-                response_json = response.json()
                 
-                if "candidates" in response_json and len(response_json["candidates"]) > 0:
-                    text = response_json["candidates"][0]["content"]["parts"][0]["text"]
-                    
-                    # Always rotate API key after a successful request and wait 2 seconds
-                    self.switch_key()
-                    time.sleep(2)
+                total_tokens = 0
+                with response:
+                    # Server-sent events: one "data: {json}" line per chunk
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith("data:"):
+                            continue
+                        
+                        chunk = json.loads(line[len("data:"):].strip())
+                        total_tokens = chunk.get("usageMetadata", {}).get("totalTokenCount", total_tokens)
+                        
+                        for candidate in chunk.get("candidates", []):
+                            for part in candidate.get("content", {}).get("parts", []):
+                                if part.get("text"):
+                                    yielded_text = True
+                                    streamed_parts.append(part["text"])
+                                    yield part["text"]
+                
+                if total_tokens:
+                    self.rate_limiter.record_tokens(api_key, model, total_tokens - estimated_tokens)
+                self.quota_ledger.record_usage(api_key, model, total_tokens or estimated_tokens)
+                
+                if yielded_text:
+                    latency = time.time() - start_time
+                    self.key_health.record_success(api_key, latency)
+                    self.model_router.record_success(model, latency)
+                    self._record_window_success(api_key, latency, latency_key)
+                    self._record_latency(latency_key, latency)
                     
-                    return text
-                else:
-                    # No valid response, switch key and retry
-                    self.switch_key()
-                    time.sleep(2)
-                    retry_count += 1
+                    if cache_key:
+                        self.response_cache.set(cache_key, "".join(streamed_parts))
+                    return
+                
+                # No valid response, retry on the next key
+                self.key_health.record_failure(api_key, None, "Empty response")
+                self.model_router.record_failure(model, None, "Empty response")
+                retry_count += 1
             
             except requests.exceptions.HTTPError as e:
-                error_str = str(e)
+                status_code = e.response.status_code if e.response is not None else None
+                error_text = e.response.text if e.response is not None else str(e)
+                self.key_health.record_failure(api_key, status_code, error_text)
                 
-                # Handle rate limiting specifically
-                if "429" in error_str and "Too Many Requests" in error_str:
-                    # Switch to next API key
-                    self.switch_key()
-                    
-                    # Add exponential backoff wait time based on retry count
-                    wait_time = (2 ** retry_count) * 2  # 2, 4, 8, 16, 32 seconds
-                    time.sleep(wait_time)
-                else:
-                    # Other HTTP error, switch key and retry
-                    self.switch_key()
-                    time.sleep(2)
+                # Invalid or revoked keys say nothing about the model itself
+                if status_code not in (400, 401, 403):
+                    self.model_router.record_failure(model, status_code, error_text)
+                
+                if status_code == 429:
+                    self.rate_limiter.penalize(api_key, model, self._get_retry_after(e.response))
+                    if "per day" in error_text.lower():
+                        self.quota_ledger.mark_exhausted(api_key, model)
+                
+                if status_code == 429 or (status_code or 0) >= 500:
+                    self._record_overload(api_key, sent_at, status_code)
                 
                 retry_count += 1
             
             except Exception as e:
-                # General exception, switch key and retry
-                self.switch_key()
-                time.sleep(2)
+                self.key_health.record_failure(api_key, None, str(e))
+                if isinstance(e, requests.exceptions.Timeout):
+                    self._record_overload(api_key, sent_at)
+                if yielded_text:
+                    raise Exception(f"Stream interrupted: {str(e)}")
+                
+                # Network failure, wait briefly before retrying on the next key
+                time.sleep(WAIT_TIME_BETWEEN_REQUESTS)
                 retry_count += 1
+            
+            finally:
+                self.release_key(api_key)
         
-        # If all retries failed with the current model, try with fallback model
-        if model == "gemini-1.5-pro":
-            return self.send_request(prompt, "gemini-1.5-flash", max_retries)
-        
-        # If we've exhausted all retries and even the fallback model failed
-        raise Exception(f"Failed to get response after {max_retries} attempts with different API keys")
\ No newline at end of file
+        raise Exception(f"Failed to get streamed response after {max_retries} attempts with different API keys")
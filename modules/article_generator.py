@@ -5,14 +5,19 @@ import json
 import random
 import datetime
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from slugify import slugify
 from modules.article_links_manager import ArticleLinksManager
 from modules.image_manager import ImageManager
+from modules.image_queue import ImageQueue, stub_image_placeholders
 from modules.api_client import GeminiClient
-from modules.utils import detect_language, generate_frontmatter
+from modules.llm_backends import create_backend_pool
+from modules.utils import detect_language, generate_frontmatter, parse_json_response
 from modules.settings import (
     OUTPUT_FOLDER, IMAGES_FOLDER, ARTICLE_LINKS_FILE,
-    DEFAULT_DOMAIN, DEFAULT_PUBLISHER, DEFAULT_TITLE_MODEL, DEFAULT_ARTICLE_MODEL
+    DEFAULT_DOMAIN, DEFAULT_PUBLISHER, DEFAULT_TITLE_MODEL, DEFAULT_ARTICLE_MODEL,
+    MAX_CONCURRENT_ARTICLES, USE_STREAMING, IMAGE_WORKERS, TITLE_BATCH_SIZE, SINGLE_CALL_GENERATION,
+    SECTIONED_GENERATION, SECTION_COUNT, DEFER_IMAGES
 )
 
 class ArticleGenerator:
@@ -21,12 +26,21 @@ class ArticleGenerator:
         self.links_manager = ArticleLinksManager(ARTICLE_LINKS_FILE)
         self.image_manager = ImageManager(IMAGES_FOLDER)
         self.api_client = GeminiClient(self.api_keys)
+        
+        # Posts saved with deferred images get them from this queue; finish any left by the last run
+        self.image_queue = ImageQueue(self.image_manager)
+        status = self.image_queue.get_status()
+        if status.get("pending") or status.get("running"):
+            self.image_queue.start()
+        
+        # Titles and articles go through the backend pool (Gemini and/or OpenAI-compatible servers)
+        self.llm = create_backend_pool(self.api_client)
     
-    def generate_title(self, subject, language, model=DEFAULT_TITLE_MODEL):
+    def _build_title_prompt(self, subject, language):
         """
-        Generate a catchy and SEO-optimized article title
+        Build the prompt for a single catchy and SEO-optimized article title
         """
-        title_prompt = (
+        return (
             f"Write a catchy and SEO-optimized article title in {language} about '{subject}'.\n\n"
             f"RULES:\n"
             f"1. Make it attention-grabbing and click-worthy without being clickbait\n"
@@ -39,9 +53,19 @@ class ArticleGenerator:
             f"8. For English titles, use power words that drive engagement and clicks\n\n"
             f"FORMAT THE TITLE EXACTLY LIKE THIS (no extra text): Title Here"
         )
+    
+    def generate_title(self, subject, language, model=DEFAULT_TITLE_MODEL):
+        """
+        Generate a catchy and SEO-optimized article title
+        """
+        response = self.llm.send_request(self._build_title_prompt(subject, language), model, stage="title")
         
-        response = self.api_client.send_request(title_prompt, model)
-        
+        return self._clean_title(response)
+    
+    def _clean_title(self, response):
+        """
+        Clean up a generated title
+        """
         # Clean up title (remove quotes and extra formatting)
         title = response.strip().replace('"', '').replace("'", "")
         
@@ -50,18 +74,79 @@ class ArticleGenerator:
         
         return title
     
-    def generate_article(self, title, subject, domain, permalink, language, model=DEFAULT_ARTICLE_MODEL, related_articles=None):
+    def generate_titles(self, subjects, model=DEFAULT_TITLE_MODEL, batch_size=TITLE_BATCH_SIZE):
         """
-        Generate a comprehensive SEO article
+        Generate titles for many subjects with one request per batch of subjects.
+        Returns the titles in the same order as the subjects. Subjects whose title is missing
+        from the batched JSON response fall back to single-title prompts, sent concurrently.
         """
-        # Add related articles information to prompt if available
-        related_links_text = ""
-        if related_articles and len(related_articles) > 0:
-            related_links_text = "RELATED ARTICLES TO INCLUDE:\n"
-            for i, article in enumerate(related_articles):
-                related_links_text += f"{i+1}. Title: \"{article['title']}\", Link: {domain}{article['permalink']}\n"
-            related_links_text += "Include these links naturally within the article content using relevant anchor text that relates to both the keyword and the destination article.\n\n"
+        languages = [detect_language(subject) for subject in subjects]
+        
+        # Build one prompt per batch, numbering subjects so titles can be mapped back
+        batches = []
+        for start in range(0, len(subjects), batch_size):
+            items = [
+                {"id": index + 1, "subject": subjects[index], "language": languages[index]}
+                for index in range(start, min(start + batch_size, len(subjects)))
+            ]
+            batches.append(items)
+        
+        prompts = []
+        for items in batches:
+            prompts.append(
+                f"Write a catchy and SEO-optimized article title for each subject below.\n\n"
+                f"RULES:\n"
+                f"1. Make it attention-grabbing and click-worthy without being clickbait\n"
+                f"2. Include the subject or a closely related term\n"
+                f"3. Keep it under 60 characters if possible\n"
+                f"4. Write each title in the language given for its subject\n"
+                f"5. Add a subtitle separated by a colon or dash if appropriate\n"
+                f"6. Do not include unnecessary punctuation or all caps\n"
+                f"7. If the language is English, make the title more professional and concise\n"
+                f"8. For English titles, use power words that drive engagement and clicks\n\n"
+                f"SUBJECTS:\n{json.dumps(items, ensure_ascii=False)}\n\n"
+                f"Return a JSON array with one object per subject, keeping its id: "
+                f"[{{\"id\": 1, \"title\": \"Title Here\"}}]"
+            )
+        
+        responses = self.llm.send_batch(
+            prompts, model, generation_config={"responseMimeType": "application/json"}, stage="title"
+        )
+        
+        titles = [None] * len(subjects)
+        for response in responses:
+            parsed = parse_json_response(response["text"]) if response["text"] else None
+            if not isinstance(parsed, list):
+                continue
+            
+            for item in parsed:
+                try:
+                    index = int(item["id"]) - 1
+                    title = self._clean_title(str(item["title"]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+                
+                if 0 <= index < len(subjects) and title:
+                    titles[index] = title
+        
+        # Fall back to one request per subject for anything the batches didn't cover, all at once
+        missing = [index for index, title in enumerate(titles) if title is None]
+        if missing:
+            fallback_responses = self.llm.send_batch(
+                [self._build_title_prompt(subjects[index], languages[index]) for index in missing], model, stage="title"
+            )
+            for index, response in zip(missing, fallback_responses):
+                if response["text"]:
+                    titles[index] = self._clean_title(response["text"])
+                else:
+                    print(f"Error generating title for '{subjects[index]}': {response['error']}")
         
+        return titles
+    
+    def _get_language_instructions(self, subject, language):
+        """
+        Get the extra language requirements for an article prompt
+        """
         # Determine if we should force English content based on subject or language
         force_english = language.lower() == "english" or any(eng_term in subject.lower() for eng_term in ["seo", "digital marketing", "google", "content marketing", "social media", "analytics"])
         
@@ -77,8 +162,31 @@ class ArticleGenerator:
                 "5. Use American English spelling and grammar conventions.\n\n"
             )
         
+        return language_specific_instructions
+    
+    def build_article_prompt(self, title, subject, domain, permalink, language, related_articles=None):
+        """
+        Build the prompt for a comprehensive SEO article
+        (title may be None when the model is asked to write the title itself)
+        """
+        if title:
+            article_heading = f"Write an extremely comprehensive and in-depth SEO-optimized article for the following title: \"{title}\""
+        else:
+            article_heading = f"Write an extremely comprehensive and in-depth SEO-optimized article about '{subject}' under the title you write."
+        
+        # Add related articles information to prompt if available
+        related_links_text = ""
+        if related_articles and len(related_articles) > 0:
+            related_links_text = "RELATED ARTICLES TO INCLUDE:\n"
+            for i, article in enumerate(related_articles):
+                related_links_text += f"{i+1}. Title: \"{article['title']}\", Link: {domain}{article['permalink']}\n"
+            related_links_text += "Include these links naturally within the article content using relevant anchor text that relates to both the keyword and the destination article.\n\n"
+        
+        # Define article language requirements
+        language_specific_instructions = self._get_language_instructions(subject, language)
+        
         article_prompt = (
-            f"Write an extremely comprehensive and in-depth SEO-optimized article for the following title: \"{title}\"\n\n"
+            f"{article_heading}\n\n"
             f"FORMAT REQUIREMENTS:\n"
             f"1. Start with an engaging 3-4 paragraph introduction that includes the domain name '{domain}' as a BOLD HYPERLINK only ONCE in the first paragraph. Format it as [**{domain}**](https://{domain}). This automatically creates both bold and hyperlink.\n"
             f"2. Immediately after the introduction, insert an image placeholder with format: [IMAGE: {subject} overview infographic].\n"
@@ -114,14 +222,229 @@ class ArticleGenerator:
             f"21. For technical or complex topics, include practical applications or simplified explanations to make the content accessible while maintaining its professional depth."
         )
         
-        response = self.api_client.send_request(article_prompt, model)
+        return article_prompt
+    
+    def generate_article(self, title, subject, domain, permalink, language, model=DEFAULT_ARTICLE_MODEL, related_articles=None):
+        """
+        Generate a comprehensive SEO article
+        """
+        article_prompt = self.build_article_prompt(title, subject, domain, permalink, language, related_articles)
+        response = self.llm.send_request(article_prompt, model, stage="article")
         return response
     
+    def generate_article_outline(self, title, subject, language, model=DEFAULT_ARTICLE_MODEL):
+        """
+        Generate an outline of H2 sections for an article.
+        Returns a list of {"heading", "points", "image"} dicts, or None if the response couldn't be used.
+        """
+        outline_prompt = (
+            f"Create a detailed outline for an extremely comprehensive SEO-optimized article titled \"{title}\" about '{subject}'.\n\n"
+            f"RULES:\n"
+            f"1. Create {SECTION_COUNT} main H2 sections that together cover the topic with expert-level depth. Do not include an introduction, conclusion, FAQ or table of contents section.\n"
+            f"2. Make each heading compelling, specific and keyword-optimized, under 60 characters. Use numbers in some headings and 'how to', 'why' or question formats in others.\n"
+            f"3. For each section list 3-5 key points: its H3 subsections, examples, data or steps it should cover.\n"
+            f"4. For each section describe one image that would illustrate it.\n"
+            f"5. Write the headings, points and image descriptions in {language}.\n\n"
+            f"Return a JSON object: {{\"sections\": [{{\"heading\": \"Heading\", \"points\": [\"point\"], \"image\": \"image description\"}}]}}"
+        )
+        
+        response = self.llm.send_request(outline_prompt, model, generation_config={"responseMimeType": "application/json"}, stage="outline")
+        parsed = parse_json_response(response)
+        
+        if not isinstance(parsed, dict) or not isinstance(parsed.get("sections"), list):
+            return None
+        
+        sections = []
+        for section in parsed["sections"]:
+            if not isinstance(section, dict) or not section.get("heading"):
+                continue
+            sections.append({
+                "heading": str(section["heading"]).strip().lstrip('#').strip(),
+                "points": [str(point) for point in section.get("points", []) if point],
+                # Square brackets would break the [IMAGE: ...] placeholder format
+                "image": re.sub(r'[\[\]]', '', str(section.get("image") or section["heading"])).strip()
+            })
+        
+        return sections or None
+    
+    def generate_article_sectioned(self, title, subject, domain, permalink, language, model=DEFAULT_ARTICLE_MODEL,
+                                   related_articles=None):
+        """
+        Generate an article by requesting an outline first, then writing the introduction, every
+        H2 section and the conclusion concurrently (spread over the API key pool) and stitching them.
+        Falls back to generate_article if the outline can't be generated.
+        """
+        sections = self.generate_article_outline(title, subject, language, model)
+        if not sections:
+            print(f"Outline for '{title}' could not be parsed, generating the article in one request")
+            return self.generate_article(title, subject, domain, permalink, language, model, related_articles)
+        
+        language_specific_instructions = self._get_language_instructions(subject, language)
+        outline_text = "\n".join(f"- {section['heading']}" for section in sections)
+        shared_context = (
+            f"You are writing one part of an SEO-optimized article titled \"{title}\" about '{subject}'. "
+            f"Other parts are written separately, so write ONLY the part requested below.\n\n"
+            f"ARTICLE OUTLINE (H2 sections):\n{outline_text}\n\n"
+            f"{language_specific_instructions}"
+            f"GENERAL REQUIREMENTS:\n"
+            f"1. Write in a professional, authoritative {language} tone that establishes genuine expertise. Address readers directly using 'you' and 'your'.\n"
+            f"2. Use markdown formatting. Do not repeat the article title.\n"
+            f"3. Bold important primary and secondary keywords related to '{subject}' where they appear naturally.\n"
+            f"4. Maintain a keyword density of 2-3% for the main keyword '{subject}'.\n\n"
+        )
+        
+        intro_prompt = (
+            f"{shared_context}"
+            f"PART TO WRITE: the introduction.\n"
+            f"1. Write an engaging 3-4 paragraph introduction that includes the domain name '{domain}' as a BOLD HYPERLINK only ONCE in the first paragraph. Format it as [**{domain}**](https://{domain}).\n"
+            f"2. Do not use any headings.\n"
+            f"3. End with this image placeholder on its own line, exactly: [IMAGE: {subject} overview infographic]"
+        )
+        
+        section_prompts = []
+        for index, section in enumerate(sections):
+            # Spread the related article links over the sections
+            related_text = ""
+            if related_articles:
+                article = related_articles[index % len(related_articles)]
+                related_text = f"6. Include a link to the related article \"{article['title']}\" ({domain}{article['permalink']}) using descriptive anchor text.\n"
+            
+            points_text = "\n".join(f"- {point}" for point in section["points"])
+            section_prompts.append(
+                f"{shared_context}"
+                f"PART TO WRITE: the H2 section \"{section['heading']}\".\n"
+                f"Cover these points:\n{points_text}\n\n"
+                f"1. Start with this image placeholder on its own line, exactly: [IMAGE: {section['image']}]\n"
+                f"2. Then the heading: ## {section['heading']}\n"
+                f"3. Write 500-900 words with 2-3 H3 subsections (###), and at least one H4 (####) where it adds detail.\n"
+                f"4. Include real-world examples, statistics, actionable steps, and at least one bulleted or numbered list or a markdown table.\n"
+                f"5. Add 1-2 external links to highly authoritative sources and one internal link formatted as [**{domain}/keyword-phrase**](https://{domain}/keyword-phrase).\n"
+                f"{related_text}"
+                f"Do not include any other image placeholders, an introduction or a conclusion."
+            )
+        
+        conclusion_prompt = (
+            f"{shared_context}"
+            f"PART TO WRITE: the conclusion.\n"
+            f"1. Write a warm, personalized conclusion paragraph that directly addresses the reader.\n"
+            f"2. Follow it with a friendly call-to-action paragraph with a bold internal link to '[**{domain}{permalink}**](https://{domain}{permalink})' using the article title as anchor text.\n"
+            f"3. Do not include any image placeholders."
+        )
+        
+        prompts = [intro_prompt] + section_prompts + [conclusion_prompt]
+        responses = self.llm.send_batch(prompts, model, stage="section")
+        
+        parts = []
+        for index, response in enumerate(responses):
+            if response["error"]:
+                if index == 0 or index == len(responses) - 1:
+                    raise Exception(f"Failed to generate {'introduction' if index == 0 else 'conclusion'}: {response['error']}")
+                print(f"Skipping section '{sections[index - 1]['heading']}': {response['error']}")
+                continue
+            parts.append(response["text"].strip())
+        
+        if len(parts) <= 2:
+            raise Exception("Failed to generate any article section")
+        
+        # The conclusion must never contain image placeholders
+        parts[-1] = re.sub(self.image_manager.PLACEHOLDER_PATTERN, '', parts[-1]).strip()
+        
+        return '\n\n'.join(parts)
+    
+    def generate_article_streaming(self, title, subject, domain, permalink, language, model=DEFAULT_ARTICLE_MODEL,
+                                   related_articles=None):
+        """
+        Generate an article with the streaming API and resolve its images while it is being written.
+        Each [IMAGE: ...] placeholder starts its search and download as soon as it has been streamed.
+        Returns the article, the article with images, and the featured image.
+        """
+        article_prompt = self.build_article_prompt(title, subject, domain, permalink, language, related_articles)
+        placeholder_pattern = re.compile(self.image_manager.PLACEHOLDER_PATTERN)
+        
+        text = ""
+        scan_position = 0
+        descriptions = []
+        futures = []
+        
+        with ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as executor:
+            for chunk in self.llm.stream_request(article_prompt, model):
+                text += chunk
+                
+                # Only complete placeholders match, a partially streamed one is picked up on a later chunk
+                for match in placeholder_pattern.finditer(text, scan_position):
+                    description = match.group(1)
+                    futures.append(executor.submit(
+                        self.image_manager.resolve_image_placeholder,
+                        description, subject, domain, len(descriptions)
+                    ))
+                    descriptions.append(description)
+                    scan_position = match.end()
+            
+            # Apply the images in article order once both the text and the downloads are done
+            results = [future.result() for future in futures]
+        
+        article_with_images, featured_image = self.image_manager.apply_image_results(text, descriptions, results, subject)
+        return text, article_with_images, featured_image
+    
+    def generate_title_and_article(self, subject, domain, language, model=DEFAULT_ARTICLE_MODEL, related_articles=None):
+        """
+        Generate the title, slug and article in a single JSON-mode request.
+        Returns (title, permalink, article), or None if the response couldn't be used.
+        """
+        # The permalink depends on the title, so the prompt uses a token that is patched afterwards
+        permalink_token = "/__PERMALINK__"
+        
+        article_prompt = self.build_article_prompt(None, subject, domain, permalink_token, language, related_articles)
+        prompt = (
+            f"First write a catchy and SEO-optimized article title in {language} about '{subject}', then write the article.\n\n"
+            f"TITLE RULES:\n"
+            f"1. Make it attention-grabbing and click-worthy without being clickbait\n"
+            f"2. Include the main keyword \"{subject}\" or a closely related term\n"
+            f"3. Keep it under 60 characters if possible\n"
+            f"4. Make sure it's in {language} language\n"
+            f"5. Add a subtitle separated by a colon or dash if appropriate\n"
+            f"6. Do not include unnecessary punctuation or all caps\n\n"
+            f"ARTICLE INSTRUCTIONS:\n{article_prompt}\n\n"
+            f"Keep the link path {permalink_token} exactly as written, it is replaced with the real article URL.\n\n"
+            f"Return a JSON object: {{\"title\": \"Title Here\", \"slug\": \"url-slug-of-the-title\", \"article\": \"the full markdown article\"}}"
+        )
+        
+        response = self.llm.send_request(prompt, model, generation_config={"responseMimeType": "application/json"}, stage="article")
+        parsed = parse_json_response(response)
+        
+        if not isinstance(parsed, dict) or not parsed.get("title") or not parsed.get("article"):
+            return None
+        
+        title = self._clean_title(str(parsed["title"]))
+        slug = slugify(str(parsed.get("slug") or "")) or slugify(title)
+        if not title or not slug:
+            return None
+        
+        permalink = f"/{slug}"
+        article = str(parsed["article"]).replace(permalink_token, permalink)
+        return title, permalink, article
+    
+    def resolve_images(self, article, subject, domain, defer_images=False):
+        """
+        Replace image placeholders with real images, or with hidden placeholders for the image queue
+        when deferred. Returns (article_with_images, featured_image).
+        """
+        if defer_images:
+            return stub_image_placeholders(article), None
+        return self.image_manager.replace_image_placeholders(article, subject, domain)
+    
     def generate_seo_article(self, subject, domain=DEFAULT_DOMAIN, model_title=DEFAULT_TITLE_MODEL, 
                             model_article=DEFAULT_ARTICLE_MODEL, category=None, publisher=DEFAULT_PUBLISHER,
-                            progress_callback=None):
+                            progress_callback=None, streaming=USE_STREAMING, title=None,
+                            single_call=SINGLE_CALL_GENERATION, sectioned=SECTIONED_GENERATION,
+                            defer_images=DEFER_IMAGES):
         """
-        Generate a complete SEO article
+        Generate a complete SEO article (pass title to skip title generation).
+        With single_call, the title and article come from one structured request.
+        With sectioned, the article is written as an outline plus concurrently generated sections.
+        Streaming is not used in either of those modes.
+        With defer_images, the post is saved with hidden placeholders and its images (and featured
+        image) are filled in later by the background image queue; streaming is not used then either.
         """
         try:
             # Detect language from subject
@@ -131,28 +454,69 @@ class ArticleGenerator:
             if progress_callback:
                 progress_callback("language", 30)
             
-            # Generate title
-            title = self.generate_title(subject, language, model_title)
-            
-            # Update progress if callback provided
-            if progress_callback:
-                progress_callback("title", 40)
-            
-            # Generate permalink
-            permalink = f"/{slugify(title)}"
+            structured = None
+            if single_call and not sectioned and not title:
+                # Related articles only depend on the subject, so they can go into the same prompt
+                related_articles = self.links_manager.get_related_articles(subject, None)
+                structured = self.generate_title_and_article(subject, domain, language, model_article, related_articles)
+                if structured is None:
+                    print(f"Structured response for '{subject}' could not be parsed, using separate requests")
             
-            # Find related articles
-            related_articles = self.links_manager.get_related_articles(subject, permalink)
+            if structured:
+                title, permalink, article = structured
+                
+                # Update progress if callback provided
+                if progress_callback:
+                    progress_callback("title", 40)
+                    progress_callback("article", 60)
+                
+                # Replace image placeholders with real images
+                article_with_images, featured_image = self.resolve_images(article, subject, domain, defer_images)
             
-            # Generate article content with related links
-            article = self.generate_article(title, subject, domain, permalink, language, model_article, related_articles)
-            
-            # Update progress if callback provided
-            if progress_callback:
-                progress_callback("article", 60)
-            
-            # Replace image placeholders with real images
-            article_with_images, featured_image = self.image_manager.replace_image_placeholders(article, subject, domain)
+            else:
+                # Generate title unless one was already generated in batch
+                if not title:
+                    title = self.generate_title(subject, language, model_title)
+                
+                # Update progress if callback provided
+                if progress_callback:
+                    progress_callback("title", 40)
+                
+                # Generate permalink
+                permalink = f"/{slugify(title)}"
+                
+                # Find related articles
+                related_articles = self.links_manager.get_related_articles(subject, permalink)
+                
+                if sectioned:
+                    # Generate the outline, then all sections in parallel
+                    article = self.generate_article_sectioned(title, subject, domain, permalink, language, model_article, related_articles)
+                    
+                    # Update progress if callback provided
+                    if progress_callback:
+                        progress_callback("article", 60)
+                    
+                    # Replace image placeholders with real images
+                    article_with_images, featured_image = self.resolve_images(article, subject, domain, defer_images)
+                elif streaming and not defer_images:
+                    # Generate article content and resolve images while the text is still streaming in
+                    article, article_with_images, featured_image = self.generate_article_streaming(
+                        title, subject, domain, permalink, language, model_article, related_articles
+                    )
+                    
+                    # Update progress if callback provided
+                    if progress_callback:
+                        progress_callback("article", 60)
+                else:
+                    # Generate article content with related links
+                    article = self.generate_article(title, subject, domain, permalink, language, model_article, related_articles)
+                    
+                    # Update progress if callback provided
+                    if progress_callback:
+                        progress_callback("article", 60)
+                    
+                    # Replace image placeholders with real images
+                    article_with_images, featured_image = self.resolve_images(article, subject, domain, defer_images)
             
             # Update progress if callback provided
             if progress_callback:
@@ -174,7 +538,7 @@ class ArticleGenerator:
             date_prefix = datetime.datetime.now().strftime('%Y-%m-%d-')
             
             # File path for markdown post in Jekyll format
-            file_md = os.path.join(OUTPUT_FOLDER, f"{date_prefix}{slugify(title)}.md")
+            file_md = os.path.join(OUTPUT_FOLDER, f"{date_prefix}{permalink.lstrip('/')}.md")
             
             # Create output folder if it doesn't exist
             os.makedirs(OUTPUT_FOLDER, exist_ok=True)
@@ -187,6 +551,10 @@ class ArticleGenerator:
             if progress_callback:
                 progress_callback("saving", 90)
             
+            # Resolve the images in the background now that the post is saved
+            if defer_images:
+                self.image_queue.enqueue(file_md, subject, domain)
+            
             # Add the article to our link manager for future reference
             self.links_manager.add_article(title, subject, permalink)
             
@@ -195,8 +563,59 @@ class ArticleGenerator:
                 "article": article_with_images,
                 "markdown": markdown_content,
                 "permalink": permalink,
-                "file_path": file_md
+                "file_path": file_md,
+                "images_pending": defer_images
             }
             
         except Exception as e:
-            raise Exception(f"Error generating article: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Error generating article: {str(e)}")
+    
+    def generate_seo_articles(self, subjects, domain=DEFAULT_DOMAIN, model_title=DEFAULT_TITLE_MODEL,
+                              model_article=DEFAULT_ARTICLE_MODEL, category=None, publisher=DEFAULT_PUBLISHER,
+                              max_workers=MAX_CONCURRENT_ARTICLES, result_callback=None, batch_titles=True,
+                              defer_images=DEFER_IMAGES, single_call=SINGLE_CALL_GENERATION,
+                              sectioned=SECTIONED_GENERATION):
+        """
+        Generate SEO articles for several subjects concurrently across the API key pool.
+        Returns one {"subject", "result", "error"} dict per subject, in the same order as the subjects.
+        result_callback(index, subject, result, error) is called as each article finishes.
+        With batch_titles, all titles are generated up front with a few batched requests, except in
+        single_call mode, where each title comes with its article.
+        """
+        results = [None] * len(subjects)
+        if not subjects:
+            return results
+        
+        # Passing a title would bypass single-call generation
+        if single_call and not sectioned:
+            batch_titles = False
+        
+        titles = self.generate_titles(subjects, model_title) if batch_titles else [None] * len(subjects)
+        
+        # By default run one article per available request slot so throughput scales with the key pool
+        workers = max_workers or self.llm.get_max_concurrency()
+        
+        with ThreadPoolExecutor(max_workers=min(workers, len(subjects))) as executor:
+            futures = {
+                executor.submit(
+                    self.generate_seo_article, subject, domain, model_title,
+                    model_article, category, publisher, title=titles[index], single_call=single_call,
+                    sectioned=sectioned, defer_images=defer_images
+                ): index
+                for index, subject in enumerate(subjects)
+            }
+            
+            for future in as_completed(futures):
+                index = futures[future]
+                subject = subjects[index]
+                try:
+                    result, error = future.result(), None
+                except Exception as e:
+                    result, error = None, str(e)
+                
+                results[index] = {"subject": subject, "result": result, "error": error}
+                
+                if result_callback:
+                    result_callback(index, subject, result, error)
+        
+        return results
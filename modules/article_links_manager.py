@@ -1,11 +1,53 @@
 import os
 import json
 import datetime
+import math
+import heapq
+import itertools
+import threading
+from collections import Counter
+from modules.utils import extract_keywords
+from modules.settings import (
+    RELATED_BM25_K1, RELATED_BM25_B, RELATED_SUBJECT_WEIGHT, RELATED_MAX_POSTINGS,
+    ARTICLE_LINKS_STORAGE, ARTICLE_LINKS_LOG_FILE, ARTICLE_LINKS_COMPACT_EVERY
+)
+
+# Every generator (one per app session) has its own manager, so writes to the same file share a lock
+_file_locks = {}
+_file_locks_lock = threading.Lock()
+
+def _get_file_lock(path):
+    with _file_locks_lock:
+        return _file_locks.setdefault(os.path.abspath(path), threading.RLock())
 
 class ArticleLinksManager:
-    def __init__(self, filename="article_links.json"):
+    def __init__(self, filename="article_links.json", log_file=ARTICLE_LINKS_LOG_FILE, storage=ARTICLE_LINKS_STORAGE):
+        """
+        Stores the title, subject and permalink of every generated article for internal linking.
+        With "jsonl" storage, new articles are appended to a log and the log is periodically
+        compacted; with "json" storage the whole JSON file is rewritten on every add.
+        """
         self.filename = filename
-        self.articles = self._load_articles()
+        self.log_file = log_file
+        self.storage = storage
+        # Articles may be added from several generator threads at once
+        self._lock = threading.Lock()
+        self._appended = 0
+        
+        self.articles = []
+        self.permalinks = {}
+        
+        # Inverted index over title and subject keywords: keyword -> {article position: weighted count}
+        self.postings = {}
+        self.lengths = []
+        self.total_length = 0
+        
+        with self._lock:
+            if self.storage == "jsonl":
+                self._load_log()
+            else:
+                for article in self._load_articles():
+                    self._add_loaded(article)
     
     def _load_articles(self):
         """
@@ -15,68 +57,216 @@ class ArticleLinksManager:
             try:
                 with open(self.filename, 'r', encoding='utf-8') as file:
                     return json.load(file)
-            except:
+            except Exception as e:
+                print(f"Error loading article links from {self.filename}: {str(e)}")
                 return []
         return []
     
+    def _add_loaded(self, article):
+        """
+        Add an article to memory and the index, unless its permalink is already known
+        """
+        if not isinstance(article, dict) or 'permalink' not in article or article['permalink'] in self.permalinks:
+            return False
+        
+        self.permalinks[article['permalink']] = len(self.articles)
+        self.articles.append(article)
+        self._index_article(len(self.articles) - 1, article)
+        return True
+    
+    def _read_log(self):
+        """
+        Read the log. Returns its articles and the number of lines that couldn't be read
+        (e.g. a line cut short by a crash while it was being appended).
+        """
+        articles = []
+        damaged = 0
+        with open(self.log_file, 'r', encoding='utf-8') as file:
+            content = file.read()
+        
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            try:
+                articles.append(json.loads(line))
+            except ValueError:
+                damaged += 1
+        
+        # A complete last line without its newline would still be merged with the next append
+        if content and not content.endswith('\n') and not damaged:
+            damaged += 1
+        
+        return articles, damaged
+    
+    def _write_log(self):
+        """
+        Rewrite the log from memory (written to a temp file first, so a crash leaves the old log intact)
+        """
+        temp_file = f"{self.log_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            for article in self.articles:
+                file.write(json.dumps(article, ensure_ascii=False) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_file, self.log_file)
+        self._appended = 0
+    
+    def _load_log(self):
+        """
+        Load the log, importing the JSON file the first time. A log holding duplicate
+        or damaged lines is compacted straight away.
+        """
+        with _get_file_lock(self.log_file):
+            if not os.path.exists(self.log_file):
+                if os.path.exists(self.filename):
+                    for article in self._load_articles():
+                        self._add_loaded(article)
+                    self._write_log()
+                    print(f"Imported {len(self.articles)} article links from {self.filename} into {self.log_file}")
+                return
+            
+            articles, damaged = self._read_log()
+            for article in articles:
+                if not self._add_loaded(article):
+                    damaged += 1
+            
+            if damaged:
+                print(f"Compacting {self.log_file} ({damaged} duplicate or damaged lines)")
+                self._write_log()
+    
+    def _compact(self):
+        """
+        Rewrite the log without duplicates, first picking up articles other managers appended to it
+        """
+        with _get_file_lock(self.log_file):
+            if os.path.exists(self.log_file):
+                articles, _ = self._read_log()
+                for article in articles:
+                    self._add_loaded(article)
+            self._write_log()
+    
+    def compact(self):
+        with self._lock:
+            if self.storage == "jsonl":
+                self._compact()
+    
+    def _append(self, article):
+        with _get_file_lock(self.log_file):
+            with open(self.log_file, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(article, ensure_ascii=False) + '\n')
+        
+        self._appended += 1
+        if self._appended >= ARTICLE_LINKS_COMPACT_EVERY:
+            self._compact()
+    
     def save_articles(self):
         """
-        Save articles to the JSON file
+        Save all articles, replacing the file (written to a temp file first so a crash can't corrupt it)
         """
-        with open(self.filename, 'w', encoding='utf-8') as file:
+        if self.storage == "jsonl":
+            with _get_file_lock(self.log_file):
+                self._write_log()
+            return
+        
+        temp_file = f"{self.filename}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as file:
             json.dump(self.articles, file, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.filename)
+    
+    def _index_article(self, position, article):
+        """
+        Add an article's keywords to the inverted index
+        """
+        counts = Counter(extract_keywords(article.get('title', '')))
+        for word in extract_keywords(article.get('subject', '')):
+            counts[word] += RELATED_SUBJECT_WEIGHT
+        
+        for word, count in counts.items():
+            self.postings.setdefault(word, {})[position] = count
+        
+        length = sum(counts.values())
+        self.lengths.append(length)
+        self.total_length += length
     
     def add_article(self, title, subject, permalink):
         """
         Add a new article to the links manager
         """
-        # Check if article with this permalink already exists
-        for article in self.articles:
-            if article['permalink'] == permalink:
+        with self._lock:
+            # Check if article with this permalink already exists
+            if permalink in self.permalinks:
                 return False
-        
-        # Add new article
-        self.articles.append({
-            'title': title,
-            'subject': subject,
-            'permalink': permalink,
-            'timestamp': datetime.datetime.now().isoformat()
-        })
-        
-        # Save to file
-        self.save_articles()
-        return True
+            
+            # Add new article
+            article = {
+                'title': title,
+                'subject': subject,
+                'permalink': permalink,
+                'timestamp': datetime.datetime.now().isoformat()
+            }
+            self._add_loaded(article)
+            
+            # Save to file
+            if self.storage == "jsonl":
+                self._append(article)
+            else:
+                self.save_articles()
+            return True
     
     def get_related_articles(self, subject, current_permalink, max_links=3):
         """
-        Get related articles based on subject similarity
+        Get related articles, ranked by BM25 over the title and subject keywords they share with the subject.
+        Only the index entries of the subject's keywords are visited, not every article. Keywords found
+        in more than RELATED_MAX_POSTINGS articles (e.g. "tips", "best") carry little weight, so they
+        only add to the scores of articles a rarer keyword matched; if no rarer keyword matches, the
+        newest RELATED_MAX_POSTINGS articles with the rarest common keyword are the candidates.
         """
-        # Get words from the subject
-        subject_words = set(subject.lower().split())
-        
-        # Score articles based on relevance
-        scored_articles = []
-        for article in self.articles:
-            # Skip the current article
-            if article['permalink'] == current_permalink:
-                continue
+        with self._lock:
+            article_count = len(self.articles)
+            if not article_count or not self.total_length:
+                return []
+            average_length = self.total_length / article_count
             
-            # Calculate word overlap for relevance
-            article_subject_words = set(article['subject'].lower().split())
-            overlap = len(subject_words.intersection(article_subject_words))
+            def score(position, count, idf):
+                length_norm = RELATED_BM25_K1 * (1 - RELATED_BM25_B + RELATED_BM25_B * self.lengths[position] / average_length)
+                return idf * count * (RELATED_BM25_K1 + 1) / (count + length_norm)
             
-            if overlap > 0:
-                scored_articles.append({
+            terms = []
+            for word in set(extract_keywords(subject)):
+                postings = self.postings.get(word)
+                if postings:
+                    idf = math.log(1 + (article_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    terms.append((len(postings), idf, postings))
+            terms.sort(key=lambda term: term[0])
+            
+            scores = {}
+            for document_count, idf, postings in terms:
+                if document_count <= RELATED_MAX_POSTINGS:
+                    candidates = postings.items()
+                elif not scores:
+                    # Positions are in insertion order, so the last entries are the newest articles
+                    candidates = itertools.islice(reversed(postings.items()), RELATED_MAX_POSTINGS)
+                else:
+                    candidates = [(position, postings[position]) for position in scores if position in postings]
+                
+                for position, count in candidates:
+                    scores[position] = scores.get(position, 0) + score(position, count, idf)
+            
+            # One extra in case the current article is among the best matches
+            best = heapq.nlargest(max_links + 1, scores.items(), key=lambda item: item[1])
+            
+            related_articles = []
+            for position, score in best:
+                article = self.articles[position]
+                if article['permalink'] == current_permalink:
+                    continue
+                related_articles.append({
                     'title': article['title'],
                     'permalink': article['permalink'],
-                    'score': overlap
+                    'score': score
                 })
-        
-        # Sort by relevance score (higher is more relevant)
-        scored_articles.sort(key=lambda x: x['score'], reverse=True)
-        
-        # Return the top N most relevant articles
-        return scored_articles[:max_links]
+            
+            return related_articles[:max_links]
     
     def get_all_articles(self):
         """
@@ -0,0 +1,247 @@
+import os
+import re
+import json
+import time
+import bisect
+import threading
+from collections import Counter
+from modules.settings import IMAGES_FOLDER, ASSETS_INDEX_FILE, ASSETS_INDEX_SAVE_EVERY, ASSETS_INDEX_RESCAN_INTERVAL
+
+class AssetsIndex:
+    IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+    
+    # Resized variants written by the image optimizer (e.g. name-800w.webp) aren't separate images
+    VARIANT_PATTERN = re.compile(r'-\d+w\.(webp|jpe?g)$')
+    
+    def __init__(self, images_folder=IMAGES_FOLDER, index_file=ASSETS_INDEX_FILE):
+        """
+        Persistent index of the images in the images folder, ordered by modification time, with a
+        word index over filenames (which are slugs of subject and description) for topic lookups.
+        It is rescanned only when the folder's mtime shows files were added, removed or renamed by
+        someone else: the folder changes made by our own downloads (wrapped in begin_write/end_write)
+        are recorded as they happen. As a safety net it is also rescanned every
+        ASSETS_INDEX_RESCAN_INTERVAL seconds.
+        """
+        self.images_folder = images_folder
+        self.index_file = index_file
+        self._lock = threading.RLock()
+        self._unsaved = 0
+        self._writing = 0
+        
+        self.dir_mtime = None
+        self.scanned_at = time.time()
+        self.mtimes = {}
+        self.ordered = []
+        self.words = {}
+        
+        os.makedirs(self.images_folder, exist_ok=True)
+        if os.path.dirname(self.index_file):
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        self._load()
+    
+    def _is_image(self, name):
+        lower_name = name.lower()
+        return lower_name.endswith(self.IMAGE_EXTENSIONS) and not self.VARIANT_PATTERN.search(lower_name)
+    
+    def _get_words(self, name):
+        return set(re.split(r'[^a-z0-9]+', os.path.splitext(name.lower())[0])) - {''}
+    
+    def _get_dir_mtime(self):
+        try:
+            return os.stat(self.images_folder).st_mtime
+        except OSError:
+            return None
+    
+    def _insert(self, name, mtime):
+        if name in self.mtimes:
+            self._remove(name)
+        
+        self.mtimes[name] = mtime
+        bisect.insort(self.ordered, (mtime, name))
+        for word in self._get_words(name):
+            self.words.setdefault(word, set()).add(name)
+    
+    def _remove(self, name):
+        mtime = self.mtimes.pop(name)
+        position = bisect.bisect_left(self.ordered, (mtime, name))
+        if position < len(self.ordered) and self.ordered[position] == (mtime, name):
+            del self.ordered[position]
+        for word in self._get_words(name):
+            self.words.get(word, set()).discard(name)
+    
+    def _rebuild(self, mtimes):
+        self.mtimes = {}
+        self.ordered = []
+        self.words = {}
+        for name, mtime in mtimes.items():
+            self._insert(name, mtime)
+    
+    def _read_saved(self):
+        """
+        Read the saved index file, or None if there isn't a readable one
+        """
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as file:
+                    return json.load(file)
+            except Exception as e:
+                print(f"Error loading assets index: {str(e)}")
+        return None
+    
+    def _load(self):
+        """
+        Load the saved index, rescanning the folder if it changed since the index was saved
+        """
+        state = self._read_saved()
+        if state:
+            self._rebuild(state.get("files", {}))
+            self.dir_mtime = state.get("dir_mtime")
+        
+        self.revalidate()
+    
+    def _save(self):
+        """
+        Save the index (written to a temp file first so a crash can't corrupt it). Other sessions
+        save to the same file, so images they recorded that still exist are merged in first.
+        """
+        state = self._read_saved()
+        if state:
+            for name, mtime in state.get("files", {}).items():
+                if name not in self.mtimes and os.path.exists(os.path.join(self.images_folder, name)):
+                    self._insert(name, mtime)
+        
+        try:
+            temp_file = f"{self.index_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as file:
+                json.dump({"dir_mtime": self.dir_mtime, "files": self.mtimes}, file)
+            os.replace(temp_file, self.index_file)
+            self._unsaved = 0
+        except Exception as e:
+            print(f"Error saving assets index: {str(e)}")
+    
+    def rescan(self):
+        """
+        Rebuild the index from a single pass over the folder
+        """
+        with self._lock:
+            dir_mtime = self._get_dir_mtime()
+            mtimes = {}
+            try:
+                with os.scandir(self.images_folder) as entries:
+                    for entry in entries:
+                        if entry.is_file() and self._is_image(entry.name):
+                            mtimes[entry.name] = entry.stat().st_mtime
+            except OSError as e:
+                print(f"Error scanning {self.images_folder}: {str(e)}")
+            
+            changed = mtimes != self.mtimes
+            if changed:
+                self._rebuild(mtimes)
+            self.dir_mtime = dir_mtime
+            self.scanned_at = time.time()
+            
+            # Nothing to write if the folder only changed by files that aren't indexed (variants, temp files)
+            if changed:
+                self._save()
+    
+    def revalidate(self):
+        """
+        Rescan only if files were added, removed or renamed by someone else since the index was
+        last in sync (a single stat of the folder). While our own downloads are being written the
+        folder mtime says nothing, so it is only checked again once they are recorded.
+        """
+        with self._lock:
+            if time.time() - self.scanned_at >= ASSETS_INDEX_RESCAN_INTERVAL:
+                self.rescan()
+            elif not self._writing and self._get_dir_mtime() != self.dir_mtime:
+                self.rescan()
+    
+    def begin_write(self):
+        """
+        Call before writing an image (and its variants) to the folder. The index is brought in
+        sync first, so the folder changes until the matching end_write are known to be our own.
+        """
+        with self._lock:
+            if not self._writing:
+                self.revalidate()
+            self._writing += 1
+    
+    def end_write(self):
+        """
+        Call once the image started with begin_write is written and added (or failed). When no
+        other writes are in progress, the folder mtime they produced is taken as in sync.
+        """
+        with self._lock:
+            self._writing -= 1
+            if not self._writing:
+                self.dir_mtime = self._get_dir_mtime()
+    
+    def add(self, path):
+        """
+        Record an image written to the folder
+        """
+        name = os.path.basename(path)
+        if not self._is_image(name):
+            return
+        
+        with self._lock:
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                return
+            
+            # The folder mtime is recorded by end_write; images added outside begin_write/end_write
+            # leave it stale, so the next lookup rescans
+            self._insert(name, mtime)
+            
+            # A lost update is harmless (the folder mtime is newer than the saved one, so the
+            # next start rescans), so the file is only rewritten every few additions
+            self._unsaved += 1
+            if self._unsaved >= ASSETS_INDEX_SAVE_EVERY:
+                self._save()
+    
+    def _site_path(self, name):
+        return f"/{self.images_folder}/{name}"  # Path from site root
+    
+    def get_newest(self, count=1):
+        """
+        Get the most recently modified images, newest first
+        """
+        with self._lock:
+            self.revalidate()
+            return [self._site_path(name) for _, name in reversed(self.ordered[-count:])] if count > 0 else []
+    
+    def find_by_topic(self, topic, count=1):
+        """
+        Get the images whose filenames share the most words with the topic (newest first among
+        equal matches), topped up with the newest images if too few match
+        """
+        with self._lock:
+            self.revalidate()
+            
+            matches = Counter()
+            for word in self._get_words(topic):
+                for name in self.words.get(word, ()):
+                    matches[name] += 1
+            
+            ranked = sorted(matches, key=lambda name: (matches[name], self.mtimes[name]), reverse=True)[:count]
+            if len(ranked) < count:
+                for _, name in reversed(self.ordered):
+                    if len(ranked) >= count:
+                        break
+                    if name not in matches:
+                        ranked.append(name)
+            
+            return [self._site_path(name) for name in ranked]
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_assets_index(images_folder=IMAGES_FOLDER):
+    """
+    Get the index of an images folder shared by all sessions, so their downloads count as own writes
+    """
+    with _indexes_lock:
+        if images_folder not in _indexes:
+            _indexes[images_folder] = AssetsIndex(images_folder)
+        return _indexes[images_folder]
@@ -0,0 +1,109 @@
+import time
+import threading
+from modules.settings import (
+    CONCURRENCY_MIN_PER_KEY, CONCURRENCY_MAX_PER_KEY, CONCURRENCY_BACKOFF
+)
+
+class AIMDWindow:
+    def __init__(self, initial, minimum, maximum, backoff=CONCURRENCY_BACKOFF):
+        """
+        Concurrency window with additive increase and multiplicative decrease
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.window = float(min(maximum, max(minimum, initial)))
+        self.last_decrease = 0
+    
+    def get_limit(self):
+        """
+        Get the number of requests currently allowed in flight
+        """
+        return max(self.minimum, int(self.window))
+    
+    def increase(self):
+        """
+        Grow the window by about one request per window's worth of healthy responses
+        """
+        self.window = min(self.maximum, self.window + 1 / self.window)
+    
+    def decrease(self, start_time):
+        """
+        Shrink the window after an overload signal. Requests sent before the last decrease
+        were sent with the old window, so their failures don't shrink it again.
+        """
+        if start_time < self.last_decrease:
+            return
+        self.window = max(self.minimum, self.window * self.backoff)
+        self.last_decrease = time.monotonic()
+
+class ConcurrencyLimiter:
+    def __init__(self, initial_per_key=1, min_per_key=CONCURRENCY_MIN_PER_KEY, max_per_key=CONCURRENCY_MAX_PER_KEY):
+        """
+        Adaptive in-flight limits for each API key and for the whole key pool.
+        Healthy responses widen the windows. A 429 halves only its key's window (the limit is per
+        key), while 5xx errors and timeouts mean the service itself is overloaded and halve both.
+        The pool's window can grow up to every key's largest window combined.
+        """
+        self.initial_per_key = initial_per_key
+        self.min_per_key = min_per_key
+        self.max_per_key = max(min_per_key, max_per_key)
+        self._lock = threading.Lock()
+        self.key_windows = {}
+        self.global_window = None
+    
+    def _get_key_window(self, api_key):
+        if api_key not in self.key_windows:
+            self.key_windows[api_key] = AIMDWindow(self.initial_per_key, self.min_per_key, self.max_per_key)
+        return self.key_windows[api_key]
+    
+    def _get_global_window(self, key_count):
+        # Sized lazily, and its ceiling follows the key count, since keys can be added or removed later
+        if self.global_window is None:
+            self.global_window = AIMDWindow(key_count * self.initial_per_key, 1, self.get_max_concurrency(key_count))
+        else:
+            self.global_window.maximum = self.get_max_concurrency(key_count)
+            self.global_window.window = min(self.global_window.window, self.global_window.maximum)
+        return self.global_window
+    
+    def get_key_limit(self, api_key):
+        with self._lock:
+            return self._get_key_window(api_key).get_limit()
+    
+    def get_global_limit(self, key_count):
+        with self._lock:
+            return self._get_global_window(key_count).get_limit()
+    
+    def get_max_concurrency(self, key_count):
+        """
+        Get the most requests the windows could ever allow, for sizing worker pools
+        """
+        return max(1, key_count * self.max_per_key)
+    
+    def record_success(self, api_key, key_count):
+        """
+        Widen the key and global windows after a response with healthy latency
+        """
+        with self._lock:
+            self._get_key_window(api_key).increase()
+            self._get_global_window(key_count).increase()
+    
+    def record_overload(self, api_key, key_count, start_time, server_overload=False):
+        """
+        Halve the key window after a 429, 5xx or timeout on a request sent at start_time
+        (time.monotonic()), and the global window too if the service itself is overloaded
+        """
+        with self._lock:
+            self._get_key_window(api_key).decrease(start_time)
+            if server_overload:
+                self._get_global_window(key_count).decrease(start_time)
+    
+    def get_status(self, api_keys):
+        """
+        Get the current windows for display
+        """
+        with self._lock:
+            return {
+                "global": round(self._get_global_window(len(api_keys)).window, 2),
+                "keys": {api_key: round(self._get_key_window(api_key).window, 2) for api_key in api_keys}
+            }
@@ -0,0 +1,117 @@
+import os
+import time
+import sqlite3
+import threading
+
+class DiskCache:
+    def __init__(self, path, ttl=0, max_bytes=0):
+        """
+        SQLite-backed key/value cache with a TTL (0 = never expires) and
+        least-recently-used eviction once the stored values exceed max_bytes (0 = unbounded)
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        
+        connection = self._connect()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        connection.commit()
+    
+    def _connect(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+    
+    def get(self, key):
+        """
+        Get a cached value, or None if it is missing or expired
+        """
+        try:
+            connection = self._connect()
+            row = connection.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            
+            value, created = row
+            now = time.time()
+            if self.ttl and now - created > self.ttl:
+                connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+                connection.commit()
+                return None
+            
+            connection.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            connection.commit()
+            return value
+        except Exception as e:
+            print(f"Error reading cache {self.path}: {str(e)}")
+            return None
+    
+    def set(self, key, value):
+        """
+        Store a value and evict the least recently used entries if the cache is too large
+        """
+        try:
+            connection = self._connect()
+            now = time.time()
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode('utf-8')), now, now)
+            )
+            connection.commit()
+            
+            if self.max_bytes:
+                self._evict(connection)
+        except Exception as e:
+            print(f"Error writing cache {self.path}: {str(e)}")
+    
+    def _evict(self, connection):
+        """
+        Remove expired entries, then least recently used ones until the cache fits in max_bytes
+        """
+        with self._lock:
+            if self.ttl:
+                connection.execute("DELETE FROM cache WHERE created < ?", (time.time() - self.ttl,))
+            
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            if total > self.max_bytes:
+                # Evict down to 90% so we don't have to evict again on the very next write
+                target = self.max_bytes * 0.9
+                for key, size in connection.execute("SELECT key, size FROM cache ORDER BY accessed ASC").fetchall():
+                    if total <= target:
+                        break
+                    connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    total -= size
+            
+            connection.commit()
+    
+    def delete(self, key):
+        """
+        Remove a single entry
+        """
+        connection = self._connect()
+        connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+        connection.commit()
+    
+    def clear(self):
+        """
+        Remove every entry
+        """
+        connection = self._connect()
+        connection.execute("DELETE FROM cache")
+        connection.commit()
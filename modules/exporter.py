@@ -8,6 +8,7 @@ from slugify import slugify
 import markdown
 import xml.etree.ElementTree as ET
 import frontmatter
+from modules.image_optimizer import load_image_variants, add_responsive_images
 from modules.settings import (
     HTML_OUTPUT_DIR, WORDPRESS_XML_FILE, BLOGSPOT_XML_FILE
 )
@@ -33,6 +34,9 @@ class Exporter:
             if not markdown_files:
                 return {"success": False, "error": "No markdown files found"}
             
+            # Optimized image variants, used for srcset and width/height in the HTML
+            image_variants = load_image_variants()
+            
             # Process each markdown file
             processed_posts = []
             for md_file in markdown_files:
@@ -100,6 +104,9 @@ class Exporter:
 </body>
 </html>"""
                     
+                    # Serve optimized images as <picture> with WebP and JPEG srcsets
+                    html_template = add_responsive_images(html_template, image_variants)
+                    
                     # Save HTML file
                     with open(html_path, 'w', encoding='utf-8') as file:
                         file.write(html_template)
@@ -0,0 +1,182 @@
+import time
+import socket
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from modules.settings import (
+    HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_MAX_SESSIONS, HTTP_TIMEOUTS, DNS_CACHE_TTL, DNS_CACHE_MAX_ENTRIES
+)
+
+class DnsCache:
+    def __init__(self, ttl=DNS_CACHE_TTL, max_entries=DNS_CACHE_MAX_ENTRIES):
+        """
+        Resolved addresses per (host, port) with a TTL, evicting the least recently used
+        entries beyond max_entries. Only used by this module's connections, so other
+        libraries' lookups are unaffected.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def resolve(self, host, port):
+        """
+        Get an address for a host, from the cache if it is still fresh
+        """
+        cache_key = (host, port)
+        now = time.monotonic()
+        
+        with self._lock:
+            cached = self._entries.get(cache_key)
+            if cached and cached[0] > now:
+                self._entries.move_to_end(cache_key)
+                return cached[1]
+        
+        address = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][4][0]
+        
+        with self._lock:
+            self._entries[cache_key] = (now + self.ttl, address)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return address
+    
+    def forget(self, host, port):
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+_dns_cache = DnsCache()
+
+class _CachedDnsConnectionMixin:
+    def _new_conn(self):
+        """
+        Connect to the cached address of the host. TLS still uses the hostname, since the socket
+        is only wrapped after this returns. If the cached address fails, it is forgotten and the
+        hostname is resolved normally.
+        """
+        dns_host = self._dns_host
+        try:
+            address = _dns_cache.resolve(dns_host, self.port)
+        except OSError:
+            return super()._new_conn()
+        
+        self._dns_host = address
+        try:
+            return super()._new_conn()
+        except Exception:
+            _dns_cache.forget(dns_host, self.port)
+            self._dns_host = dns_host
+            return super()._new_conn()
+        finally:
+            self._dns_host = dns_host
+
+class CachedDnsHTTPConnection(_CachedDnsConnectionMixin, HTTPConnection):
+    pass
+
+class CachedDnsHTTPSConnection(_CachedDnsConnectionMixin, HTTPSConnection):
+    pass
+
+class CachedDnsHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CachedDnsHTTPConnection
+
+class CachedDnsHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CachedDnsHTTPSConnection
+
+class CachedDnsAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connections look hosts up through the DNS cache
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CachedDnsHTTPConnectionPool,
+            "https": CachedDnsHTTPSConnectionPool
+        }
+
+class HttpTransport:
+    def __init__(self, pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 max_sessions=HTTP_MAX_SESSIONS, timeouts=None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_sessions = max_sessions
+        self.timeouts = timeouts or HTTP_TIMEOUTS
+        
+        # Keep-alive sessions per host, least recently used first
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _create_session(self):
+        session = requests.Session()
+        
+        # Repeated requests to the same host skip DNS (unless DNS_CACHE_TTL is 0)
+        adapter_class = CachedDnsAdapter if DNS_CACHE_TTL > 0 else HTTPAdapter
+        adapter = adapter_class(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+    
+    def get_session(self, url):
+        """
+        Get the pooled session for the host of a URL
+        """
+        parsed = urlparse(url)
+        host = f"{parsed.scheme}://{parsed.netloc}"
+        
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is not None:
+                self._sessions.move_to_end(host)
+                return session
+            
+            session = self._create_session()
+            self._sessions[host] = session
+            
+            # Image downloads touch many one-off hosts, so drop the least recently used sessions.
+            # They aren't closed here: another thread may still be using one (e.g. streaming a
+            # download), and its pool closes its connections once nothing references it.
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            
+            return session
+    
+    def request(self, method, url, kind="default", **kwargs):
+        """
+        Send a request through the pooled session for the URL's host.
+        kind selects the timeout from HTTP_TIMEOUTS ("gemini", "search", "download", ...)
+        unless an explicit timeout is given.
+        """
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeouts.get(kind, self.timeouts["default"])
+        return self.get_session(url).request(method, url, **kwargs)
+    
+    def get(self, url, kind="default", **kwargs):
+        return self.request("GET", url, kind, **kwargs)
+    
+    def post(self, url, kind="default", **kwargs):
+        return self.request("POST", url, kind, **kwargs)
+    
+    def close(self):
+        """
+        Close every pooled session
+        """
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+_transport = None
+_transport_lock = threading.Lock()
+
+def get_transport():
+    """
+    Get the transport shared by the Gemini client, image search and downloads
+    """
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = HttpTransport()
+        return _transport
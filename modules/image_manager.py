@@ -1,109 +1,228 @@
 import os
 import re
-import random
-import requests
+import json
+import time
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from slugify import slugify
-from modules.settings import IMAGES_FOLDER
+from modules.http_transport import get_transport
+from modules.disk_cache import DiskCache
+from modules.image_store import ImageStore
+from modules.image_optimizer import ImageOptimizer
+from modules.assets_index import get_assets_index
+from modules.image_providers import get_provider, get_providers
+from modules.image_probe import sniff_image_type, get_image_dimensions, parse_content_range_total
+from modules.settings import (
+    IMAGES_FOLDER, PARALLEL_IMAGES, IMAGE_WORKERS, HTTP_TIMEOUTS, IMAGE_STORE_ENABLED,
+    IMAGE_PROBE_ENABLED, IMAGE_PROBE_CANDIDATES, IMAGE_PROBE_BYTES, IMAGE_MAX_BYTES, IMAGE_MIN_WIDTH,
+    CONCURRENT_IMAGE_SEARCH, IMAGE_SEARCH_WORKERS, IMAGE_PROVIDERS, IMAGE_SEARCH_BUDGET, IMAGE_SEARCH_ENOUGH,
+    IMAGE_SEARCH_CACHE_ENABLED, IMAGE_SEARCH_CACHE_FILE, IMAGE_SEARCH_CACHE_TTL, IMAGE_SEARCH_CACHE_MAX_BYTES
+)
+
+class SearchBudget:
+    def __init__(self, seconds):
+        """
+        Latency budget for the searches of one placeholder (None or 0 = no limit). The clock only
+        starts once the first search actually runs, so time spent queued behind the searches of
+        other placeholders doesn't use it up.
+        """
+        self.seconds = seconds or None
+        self.started_at = None
+        self._lock = threading.Lock()
+    
+    def start(self):
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = time.monotonic()
+    
+    def remaining(self):
+        """
+        Seconds left (the whole budget until started), or None if there is no limit
+        """
+        if self.seconds is None:
+            return None
+        if self.started_at is None:
+            return self.seconds
+        return self.seconds - (time.monotonic() - self.started_at)
+    
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
 
 class ImageManager:
+    PLACEHOLDER_PATTERN = r'\[IMAGE: (.*?)\]'
+    
+    # Preferred formats first when ranking probed candidates
+    IMAGE_TYPE_RANK = {"jpeg": 0, "webp": 0, "png": 1, "gif": 2}
+    
     def __init__(self, images_folder=IMAGES_FOLDER):
         self.images_folder = images_folder
+        self.transport = get_transport()
         os.makedirs(self.images_folder, exist_ok=True)
+        
+        # On-disk cache of search results (provider + query -> image URLs), shared across articles and runs
+        self.search_cache = DiskCache(IMAGE_SEARCH_CACHE_FILE, IMAGE_SEARCH_CACHE_TTL, IMAGE_SEARCH_CACHE_MAX_BYTES) if IMAGE_SEARCH_CACHE_ENABLED else None
+        
+        # Downloaded images stored once by content hash, indexed by source URL
+        self.image_store = ImageStore() if IMAGE_STORE_ENABLED else None
+        
+        # Images already in the folder, by mtime and filename words, for fallback images
+        self.assets_index = get_assets_index(self.images_folder)
+        
+        # Resized WebP/JPEG variants of downloaded images, encoded in a process pool
+        self.optimizer = ImageOptimizer(self.images_folder)
+        
+        # Threads running provider searches and candidate probes side by side, shared by all placeholders
+        self._search_executor = ThreadPoolExecutor(max_workers=IMAGE_SEARCH_WORKERS)
+        self._probe_executor = ThreadPoolExecutor(max_workers=IMAGE_SEARCH_WORKERS)
+    
+    def _get_search_cache_key(self, provider, query):
+        # Queries differing only in case or spacing return the same results
+        return f"{provider}:{' '.join(query.lower().split())}"
     
-    def get_images_from_bing(self, query):
+    def get_cached_search(self, provider, query):
         """
-        Search for images using Bing
+        Get the cached image URLs for a provider and query, or None if not cached
         """
-        try:
-            # Set up the headers for the request
-            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-            
-            # Construct search URL
-            search_url = f"https://www.bing.com/images/search?q={query}&first=1"
-            
-            # Get the HTML content of the search results page
-            response = requests.get(search_url, headers=headers, timeout=10)
-            response.raise_for_status()
-            html_content = response.text
-            
-            if not html_content:
-                return []
-            
-            # Extract image URLs using regex
-            img_urls = re.findall(r'murl&quot;:&quot;(.*?)&quot;', html_content)
-            
-            if not img_urls or len(img_urls) == 0:
-                return []
-            
-            # Create image objects from the URLs (up to 5 images)
-            images = []
-            for i, url in enumerate(img_urls[:5]):
-                images.append({
-                    "url": url,
-                    "title": f"{query} image {i+1}",
-                    "source": "Bing"
-                })
-            
-            return images
+        if not self.search_cache:
+            return None
         
+        cached = self.search_cache.get(self._get_search_cache_key(provider, query))
+        return json.loads(cached) if cached is not None else None
+    
+    def cache_search(self, provider, query, urls):
+        """
+        Cache the image URLs a provider returned for a query. Empty results aren't cached,
+        since they are often a temporary block rather than a real lack of images.
+        """
+        if self.search_cache and urls:
+            self.search_cache.set(self._get_search_cache_key(provider, query), json.dumps(urls))
+    
+    def build_image_results(self, query, urls, source):
+        """
+        Create image objects from the URLs (up to 5 images)
+        """
+        images = []
+        for i, url in enumerate(urls[:5]):
+            images.append({
+                "url": url,
+                "title": f"{query} image {i+1}",
+                "source": source
+            })
+        return images
+    
+    def search_provider(self, name, query, timeout=None):
+        """
+        Search for images with a registered provider, answering from the search cache when possible
+        """
+        provider = get_provider(name)
+        if provider is None:
+            return []
+        
+        cached_urls = self.get_cached_search(name, query)
+        if cached_urls is not None:
+            return self.build_image_results(query, cached_urls, provider.source)
+        
+        try:
+            urls = provider.search(self.transport, query, timeout)
         except Exception as e:
-            print(f"Error in get_images_from_bing for query '{query}': {str(e)}")
+            print(f"Error in {provider.source} image search for query '{query}': {str(e)}")
             return []
+        
+        self.cache_search(name, query, urls)
+        return self.build_image_results(query, urls, provider.source)
     
-    def get_images_from_yahoo(self, query):
+    def get_images_from_bing(self, query, timeout=None):
+        """
+        Search for images using Bing
+        """
+        return self.search_provider("bing", query, timeout)
+    
+    def get_images_from_yahoo(self, query, timeout=None):
         """
         Search for images using Yahoo
         """
-        try:
-            # Set up the headers for the request
-            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-            
-            # Construct search URL
-            search_url = f"https://images.search.yahoo.com/search/images?p={query}"
-            
-            # Get the HTML content of the search results page
-            response = requests.get(search_url, headers=headers, timeout=10)
-            response.raise_for_status()
-            html_content = response.text
-            
-            if not html_content:
-                return []
-            
-            # Extract image URLs using regex - adapt this regex pattern for Yahoo's HTML structure
-            img_urls = re.findall(r'<img[^>]+src="([^"]+)"[^>]*class="process[^>]*>', html_content)
-            
-            if not img_urls or len(img_urls) == 0:
-                # Try alternative pattern
-                img_urls = re.findall(r'<img[^>]+data-src="([^"]+)"[^>]*class="process[^>]*>', html_content)
-            
-            if not img_urls or len(img_urls) == 0:
-                # Try another alternative pattern
-                img_urls = re.findall(r'<img[^>]+src="([^"]+)"[^>]*>', html_content)
-                # Filter out small images and icons
-                img_urls = [url for url in img_urls if not ('icon' in url.lower() or 'logo' in url.lower())]
-                
-            if not img_urls or len(img_urls) == 0:
-                return []
+        return self.search_provider("yahoo", query, timeout)
+    
+    def is_supported_image_url(self, img_url):
+        """
+        Check if the URL contains valid image format indicators
+        """
+        return (img_url.endswith('.jpg') or img_url.endswith('.jpeg') or 
+                img_url.endswith('.png') or img_url.endswith('.gif') or 
+                '.jpg?' in img_url or '.jpeg?' in img_url or '.png?' in img_url or 
+                '/photo/' in img_url or '/image/' in img_url)
+    
+    def _get_search_timeout(self, budget):
+        """
+        Get the (connect, read) timeout for a search so it doesn't outlive the latency budget
+        """
+        if budget is None or budget.remaining() is None:
+            return None
+        
+        remaining = max(0.5, budget.remaining())
+        connect_timeout, read_timeout = HTTP_TIMEOUTS["search"]
+        return (min(connect_timeout, remaining), min(read_timeout, remaining))
+    
+    def _run_search(self, search, query, budget):
+        # Runs on a search worker: the budget starts with the first search that gets a worker
+        if budget is not None:
+            budget.start()
+        return search(query, self._get_search_timeout(budget))
+    
+    def search_concurrently(self, searches, budget=None, enough=IMAGE_SEARCH_ENOUGH):
+        """
+        Run several (provider function, query) searches at once and return their images combined
+        in the order of the searches. Returns as soon as enough usable candidates have arrived or
+        the budget (a SearchBudget) runs out; searches that haven't started are cancelled and
+        the results of those still running are ignored.
+        """
+        futures = [
+            self._search_executor.submit(self._run_search, search, query, budget)
+            for search, query in searches
+        ]
+        results = [[] for _ in futures]
+        pending = set(futures)
+        
+        while pending:
+            # Until a search has a worker this is the whole budget, so queued searches keep waiting
+            remaining = budget.remaining() if budget is not None else None
+            if remaining is not None and remaining <= 0:
+                break
             
-            # Create image objects from the URLs (up to 5 images)
-            images = []
-            for i, url in enumerate(img_urls[:5]):
-                images.append({
-                    "url": url,
-                    "title": f"{query} image {i+1}",
-                    "source": "Yahoo"
-                })
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[futures.index(future)] = future.result()
             
-            return images
+            usable = sum(1 for images in results for img in images if self.is_supported_image_url(img['url']))
+            if usable >= enough:
+                break
         
-        except Exception as e:
-            print(f"Error in get_images_from_yahoo for query '{query}': {str(e)}")
-            return []
+        for future in pending:
+            future.cancel()
+        
+        return [img for images in results for img in images]
     
-    def get_images(self, query):
+    def get_images(self, query, budget=None):
         """
-        Get images from both Bing and Yahoo
+        Get images from both Bing and Yahoo.
+        With CONCURRENT_IMAGE_SEARCH every provider in IMAGE_PROVIDERS is queried at the same time
+        and the search stops early once there are enough candidates or the budget runs out.
         """
+        if CONCURRENT_IMAGE_SEARCH:
+            providers = [functools.partial(self.search_provider, provider.name) for provider in get_providers(IMAGE_PROVIDERS)]
+            all_images = self.search_concurrently([(provider, query) for provider in providers], budget)
+            
+            # If we still don't have enough images, try with a simplified query
+            if len(all_images) < 2 and (budget is None or not budget.expired()):
+                simplified_query = ' '.join(query.split()[:3])
+                all_images = all_images + self.search_concurrently(
+                    [(provider, simplified_query) for provider in providers], budget
+                )
+            
+            return all_images
+        
         # Try Bing first
         bing_images = self.get_images_from_bing(query)
         
@@ -133,191 +252,379 @@ class ImageManager:
         
         return all_images
     
-    def find_existing_images_in_assets(self, count=1):
+    def find_existing_images_in_assets(self, count=1, topic=None):
         """
-        Find existing images in the assets folder
+        Find existing images in the assets folder: the newest ones, or with a topic, the ones whose
+        filenames best match it. Served from the assets index rather than a folder scan.
         """
-        # Ensure assets directory exists
-        os.makedirs(self.images_folder, exist_ok=True)
+        if topic:
+            return self.assets_index.find_by_topic(topic, count)
+        return self.assets_index.get_newest(count)
+    
+    def probe_image(self, img_url, timeout=None):
+        """
+        Fetch only the first bytes of a candidate image (ranged GET) to check what it really is.
+        Returns {"type", "size", "width", "height"} (size and dimensions may be None when unknown),
+        or None if the URL doesn't serve a supported image or the image is over IMAGE_MAX_BYTES.
+        """
+        if self.image_store:
+            blob = self.image_store.get_by_url(img_url)
+            if blob is not None:
+                # Downloaded before, read the header from disk instead of the network
+                with open(blob, 'rb') as blob_file:
+                    data = blob_file.read(IMAGE_PROBE_BYTES)
+                image_type = sniff_image_type(data)
+                if image_type is None:
+                    return None
+                
+                dimensions = get_image_dimensions(data, image_type) or (None, None)
+                return {"type": image_type, "size": os.path.getsize(blob), "width": dimensions[0], "height": dimensions[1]}
+        
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Range': f"bytes=0-{IMAGE_PROBE_BYTES - 1}"
+        }
         
-        # List all files in the assets directory
-        image_files = []
-        for file in os.listdir(self.images_folder):
-            # Check if file is an image
-            if file.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp')):
-                image_files.append(f"/{self.images_folder}/{file}")  # Path from site root
+        response = self.transport.get(img_url, kind="download", headers=headers, stream=True, timeout=timeout)
+        with response:
+            response.raise_for_status()
+            
+            content_type = response.headers.get('Content-Type', '').lower()
+            if content_type.startswith('text/') or 'html' in content_type:
+                return None
+            
+            # Servers that ignore the Range header send the whole file, so stop reading after the probe size
+            data = b""
+            for chunk in response.iter_content(chunk_size=8192):
+                data += chunk
+                if len(data) >= IMAGE_PROBE_BYTES:
+                    break
+            
+            if response.status_code == 206:
+                size = parse_content_range_total(response.headers.get('Content-Range'))
+            else:
+                content_length = response.headers.get('Content-Length', '')
+                size = int(content_length) if content_length.isdigit() else None
         
-        # Sort by modification time (newest first)
-        image_files.sort(key=lambda x: os.path.getmtime(x.lstrip('/')), reverse=True)
+        image_type = sniff_image_type(data)
+        if image_type is None or (size and size > IMAGE_MAX_BYTES):
+            return None
         
-        # Return requested number of images or all if fewer exist
-        return image_files[:count]
+        dimensions = get_image_dimensions(data, image_type) or (None, None)
+        return {"type": image_type, "size": size, "width": dimensions[0], "height": dimensions[1]}
     
-    def replace_image_placeholders(self, article, subject, domain):
+    def probe_candidates(self, images, budget=None):
         """
-        Replace image placeholders with real images
+        Probe the top IMAGE_PROBE_CANDIDATES search results in parallel and return the usable ones,
+        best first: wide enough images before small ones, preferred formats, then files that
+        aren't needlessly large, keeping search order among equals
         """
-        # Find all image placeholders
-        pattern = r'\[IMAGE: (.*?)\]'
-        image_descriptions = re.findall(pattern, article)
+        candidates = images[:IMAGE_PROBE_CANDIDATES]
+        futures = [
+            self._probe_executor.submit(self.probe_image, img['url'], self._get_search_timeout(budget))
+            for img in candidates
+        ]
         
-        # Track the first image path for the featured image
-        featured_image = None
+        remaining = budget.remaining() if budget is not None else None
+        if remaining is not None:
+            remaining = max(0.5, remaining)
+        wait(futures, timeout=remaining)
         
-        if not image_descriptions:
-            # If no placeholders found, try to use an existing image from assets
-            existing_images = self.find_existing_images_in_assets(1)
-            if existing_images:
-                featured_image = existing_images[0]
-            return article, featured_image
+        ranked = []
+        for position, (img, future) in enumerate(zip(candidates, futures)):
+            if not future.done():
+                future.cancel()
+                continue
+            
+            try:
+                info = future.result()
+            except Exception as e:
+                print(f"Error probing image {img['url']}: {str(e)}")
+                continue
+            
+            if info is None:
+                continue
+            
+            too_small = info["width"] is not None and info["width"] < IMAGE_MIN_WIDTH
+            oversized = info["size"] is not None and info["size"] > IMAGE_MAX_BYTES // 2
+            rank = (too_small, self.IMAGE_TYPE_RANK.get(info["type"], 3), oversized, position)
+            ranked.append((rank, dict(img, **info)))
         
-        # Replace each placeholder with an image
-        modified_article = article
-        for i, description in enumerate(image_descriptions):
-            # We'll use the first image as the featured image for the frontmatter
+        ranked.sort(key=lambda item: item[0])
+        return [img for _, img in ranked]
+    
+    def _limit_download(self, img_response, img_url):
+        """
+        Yield the body of an image download, aborting if it isn't an image or grows past IMAGE_MAX_BYTES
+        """
+        content_length = img_response.headers.get('Content-Length', '')
+        if content_length.isdigit() and int(content_length) > IMAGE_MAX_BYTES:
+            raise Exception(f"Image too large ({content_length} bytes): {img_url}")
+        
+        total = 0
+        for chunk in img_response.iter_content(chunk_size=8192):
+            if not chunk:
+                continue
+            
+            if total == 0 and sniff_image_type(chunk) is None:
+                raise Exception(f"Not an image: {img_url}")
+            
+            total += len(chunk)
+            if total > IMAGE_MAX_BYTES:
+                raise Exception(f"Image larger than {IMAGE_MAX_BYTES} bytes: {img_url}")
+            
+            yield chunk
+    
+    def download_first_image(self, img_urls, img_save_path):
+        """
+        Download the first of several candidate URLs that works. Returns the URL that was saved.
+        """
+        last_error = None
+        for img_url in img_urls:
             try:
-                # The query should be specific and include the subject and the description
-                query = f"{subject} {description}"
-                
-                # Use our combined image search function
-                images = self.get_images(query)
+                self.download_image(img_url, img_save_path)
+                return img_url
+            except Exception as e:
+                print(f"Error downloading image {img_url}: {str(e)}")
+                last_error = e
+        raise last_error
+    
+    def download_image(self, img_url, img_save_path):
+        """
+        Save the image at img_url to img_save_path.
+        With the image store, a URL downloaded before is reused without any network request, and
+        identical images are kept once on disk and linked under each SEO filename.
+        """
+        if self.image_store:
+            blob = self.image_store.get_by_url(img_url)
+            if blob is not None:
+                return self.image_store.link(blob, img_save_path)
+        
+        # Set up request headers
+        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+        
+        # Download the image
+        img_response = self.transport.get(img_url, kind="download", headers=headers, stream=True)
+        with img_response:
+            img_response.raise_for_status()
+            
+            if self.image_store:
+                blob = self.image_store.save(img_url, self._limit_download(img_response, img_url))
+                return self.image_store.link(blob, img_save_path)
+            
+            # An existing file may be a link into the image store, so replace it rather than writing through it
+            if os.path.lexists(img_save_path):
+                os.remove(img_save_path)
+            
+            # Save the image to assets folder (removing a partial file if the download is aborted)
+            try:
+                with open(img_save_path, 'wb') as img_file:
+                    for chunk in self._limit_download(img_response, img_url):
+                        img_file.write(chunk)
+            except Exception:
+                os.remove(img_save_path)
+                raise
+        return img_save_path
+    
+    def find_image_placeholders(self, article):
+        """
+        Find all image placeholder descriptions in an article, in order
+        """
+        return re.findall(self.PLACEHOLDER_PATTERN, article)
+    
+    def resolve_image_placeholder(self, description, subject, domain, index):
+        """
+        Find and download an image for a single placeholder.
+        Returns the markdown that replaces the placeholder and the image path to use as the
+        featured image if this placeholder is the first one to produce an image (or None).
+        """
+        featured_image = None
+        
+        try:
+            # The query should be specific and include the subject and the description
+            query = f"{subject} {description}"
+            
+            # Searches for this placeholder stop once its latency budget is spent
+            budget = SearchBudget(IMAGE_SEARCH_BUDGET)
+            
+            # Use our combined image search function
+            images = self.get_images(query, budget)
+            
+            # Try up to 3 times with different queries if needed
+            attempts = 0
+            while not images and attempts < 3 and not budget.expired():
+                attempts += 1
+                if attempts == 1:
+                    # Try just the description
+                    query = description
+                elif attempts == 2:
+                    # Try the subject
+                    query = subject
+                else:
+                    # Try a more generic term related to the subject
+                    query = f"{subject} image"
                 
-                # Try up to 3 times with different queries if needed
-                attempts = 0
-                while not images and attempts < 3:
-                    attempts += 1
-                    if attempts == 1:
-                        # Try just the description
-                        query = description
-                    elif attempts == 2:
-                        # Try the subject
-                        query = subject
-                    else:
-                        # Try a more generic term related to the subject
-                        query = f"{subject} image"
+                images = self.get_images(query, budget)
+            
+            if not images:
+                # If all attempts failed, keep the placeholder but mark it
+                return f"<!-- Could not find image for: {description} -->", None
+            
+            # Find a supported image format from the available images
+            valid_image = None
+            for img in images:
+                img_url = img['url']
+                # Check if the URL contains valid image format indicators
+                if self.is_supported_image_url(img_url):
+                    valid_image = img
+                    break
+            
+            # If no valid images found, use the first one
+            if valid_image is None and images:
+                valid_image = images[0]
+            
+            # Check the top candidates' real type, size and dimensions, and use the best working one
+            fallback_urls = []
+            if IMAGE_PROBE_ENABLED:
+                probed = self.probe_candidates(images, budget)
+                if probed:
+                    valid_image = probed[0]
+                    fallback_urls = [candidate['url'] for candidate in probed[1:]]
+            
+            # If we have a valid image, use it
+            if valid_image:
+                img_url = valid_image['url']
+                img_title = f"{description}"
+                img_source = valid_image.get('source', 'Image Search')
+            else:
+                # No images available
+                raise Exception("No valid images found")
+            
+            # Create a filename with the format: keyword-title-domain-number.jpg
+            # Format domain as bloggers-web-id (replacing dots with hyphens)
+            domain_part = domain.replace('.', '-')  # Convert dots to hyphens (e.g., "bloggers-web-id")
+            # Combine subject and description to create the keyword part
+            keyword_title = slugify(f"{subject}-{description}")[:40]  # Limit length to avoid excessively long filenames
+            img_filename = f"{keyword_title}-{domain_part}-{index+1}.jpg"
+            img_save_path = os.path.join(self.images_folder, img_filename)
+            img_rel_path = f"{self.images_folder}/{img_filename}"
+            
+            # Download and save the image, moving on to the next probed candidate if it fails
+            try:
+                # The index records the folder changes of our own write, so lookups don't rescan for them
+                self.assets_index.begin_write()
+                try:
+                    img_url = self.download_first_image([img_url] + fallback_urls, img_save_path)
                     
-                    images = self.get_images(query)
+                    # Resize and re-encode; the article then shows the largest WebP variant
+                    optimized = self.optimizer.optimize(img_save_path)
+                    self.assets_index.add(img_save_path)
+                finally:
+                    self.assets_index.end_write()
                 
-                if images and len(images) > 0:
-                    # Find a supported image format from the available images
-                    valid_image = None
-                    for img in images:
-                        img_url = img['url']
-                        # Check if the URL contains valid image format indicators
-                        if (img_url.endswith('.jpg') or img_url.endswith('.jpeg') or 
-                            img_url.endswith('.png') or img_url.endswith('.gif') or 
-                            '.jpg?' in img_url or '.jpeg?' in img_url or '.png?' in img_url or 
-                            '/photo/' in img_url or '/image/' in img_url):
-                            valid_image = img
-                            break
+                # Create markdown image tag with local path (ensuring it starts with a slash for absolute path)
+                if not img_rel_path.startswith('/'):
+                    img_rel_path = f"/{img_rel_path}"
+                img_src = optimized["variants"][-1]["webp"] if optimized else img_rel_path
+                img_tag = f"![{img_title}]({img_src})"
+                
+                # Check if the image URL is valid and supported before offering it as featured image
+                if img_url and (img_url.endswith('.jpg') or img_url.endswith('.jpeg') or 
+                              img_url.endswith('.png') or img_url.endswith('.gif') or 
+                              'image' in img_url.lower()):
+                    # Use the local image path from assets for the featured image
+                    featured_image = f"/{img_rel_path}"  # Use relative path from site root
+                else:
+                    print(f"Skipping unsupported image format: {img_url}")
+                
+                return img_tag, featured_image
+            
+            except Exception as e:
+                print(f"Error downloading image for '{description}': {str(e)}")
+                
+                # Try to find an existing image on the same topic in the assets folder to use instead
+                existing_images = self.find_existing_images_in_assets(1, f"{subject} {description}")
+                if existing_images:
+                    # Use an existing image from assets folder
+                    existing_img_path = existing_images[0]
+                    img_tag = f"![{img_title}]({existing_img_path})"
                     
-                    # If no valid images found, use the first one
-                    if valid_image is None and images:
-                        valid_image = images[0]
+                    # Use this as featured image if we don't have one yet
+                    featured_image = existing_img_path
+                else:
+                    # If no existing images, create a fallback reference
+                    domain_part = domain.replace('.', '-')  # Convert dots to hyphens
+                    filename = f"{slugify(description)}-{domain_part}-fallback.jpg"
+                    img_rel_path = f"{self.images_folder}/{filename}"
                     
-                    # If we have a valid image, use it
-                    if valid_image:
-                        img_url = valid_image['url']
-                        img_title = f"{description}"
-                        img_source = valid_image.get('source', 'Image Search')
+                    # Try to get any existing image from the assets folder rather than using a placeholder
+                    all_assets = self.find_existing_images_in_assets(5, subject)  # Get up to 5 existing images
+                    if all_assets:
+                        # Use the existing image closest to the subject
+                        closest_img = all_assets[0]
+                        # Ensure the path starts with a slash for absolute path
+                        if not closest_img.startswith('/'):
+                            closest_img = f"/{closest_img}"
+                        img_tag = f"![{img_title}]({closest_img})"
                     else:
-                        # No images available
-                        raise Exception("No valid images found")
-                    
-                    # Create a filename with the format: keyword-title-domain-number.jpg
-                    # Format domain as bloggers-web-id (replacing dots with hyphens)
-                    domain_part = domain.replace('.', '-')  # Convert dots to hyphens (e.g., "bloggers-web-id")
-                    # Combine subject and description to create the keyword part
-                    keyword_title = slugify(f"{subject}-{description}")[:40]  # Limit length to avoid excessively long filenames
-                    img_filename = f"{keyword_title}-{domain_part}-{i+1}.jpg"
-                    img_save_path = os.path.join(self.images_folder, img_filename)
-                    img_rel_path = f"{self.images_folder}/{img_filename}"
+                        # If no images at all, create a text-only reference
+                        img_tag = f"<!-- Image for {img_title} could not be retrieved -->"
                     
-                    # Download and save the image
-                    try:
-                        # Set up request headers
-                        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-                        
-                        # Download the image
-                        img_response = requests.get(img_url, headers=headers, stream=True, timeout=10)
-                        img_response.raise_for_status()
-                        
-                        # Save the image to assets folder
-                        with open(img_save_path, 'wb') as img_file:
-                            for chunk in img_response.iter_content(chunk_size=8192):
-                                img_file.write(chunk)
-                        
-                        # Create markdown image tag with local path (ensuring it starts with a slash for absolute path)
-                        if not img_rel_path.startswith('/'):
-                            img_rel_path = f"/{img_rel_path}"
-                        img_tag = f"![{img_title}]({img_rel_path})"
-                        
-                        # Store the local path to the image rather than the URL
-                        if featured_image is None:
-                            # Check if the image URL is valid and supported
-                            if img_url and (img_url.endswith('.jpg') or img_url.endswith('.jpeg') or 
-                                          img_url.endswith('.png') or img_url.endswith('.gif') or 
-                                          'image' in img_url.lower()):
-                                # Use the local image path from assets for the featured image
-                                featured_image = f"/{img_rel_path}"  # Use relative path from site root
-                            else:
-                                print(f"Skipping unsupported image format: {img_url}")
-                        
-                        # Replace the placeholder with the image tag
-                        modified_article = modified_article.replace(f"[IMAGE: {description}]", img_tag)
-                    
-                    except Exception as e:
-                        print(f"Error downloading image for '{description}': {str(e)}")
-                        
-                        # Try to find an existing image in the assets folder to use instead
-                        existing_images = self.find_existing_images_in_assets(1)
-                        if existing_images:
-                            # Use an existing image from assets folder
-                            existing_img_path = existing_images[0]
-                            img_tag = f"![{img_title}]({existing_img_path})"
-                            
-                            # Use this as featured image if we don't have one yet
-                            if featured_image is None:
-                                featured_image = existing_img_path
-                        else:
-                            # If no existing images, create a fallback reference
-                            domain_part = domain.replace('.', '-')  # Convert dots to hyphens
-                            filename = f"{slugify(description)}-{domain_part}-fallback.jpg"
-                            img_rel_path = f"{self.images_folder}/{filename}"
-                            
-                            # Try to get any existing image from the assets folder rather than using a placeholder
-                            all_assets = self.find_existing_images_in_assets(5)  # Get up to 5 existing images
-                            if all_assets:
-                                # Use an existing image from the assets folder
-                                random_img = random.choice(all_assets)  # Pick a random image for variety
-                                # Ensure the path starts with a slash for absolute path
-                                if not random_img.startswith('/'):
-                                    random_img = f"/{random_img}"
-                                img_tag = f"![{img_title}]({random_img})"
-                            else:
-                                # If no images at all, create a text-only reference
-                                img_tag = f"<!-- Image for {img_title} could not be retrieved -->"
-                            
-                            # Still use the relative path format for consistency
-                            if featured_image is None:
-                                featured_image = f"/{img_rel_path}"
-                        
-                        # Replace the placeholder with the appropriate image tag
-                        modified_article = modified_article.replace(f"[IMAGE: {description}]", img_tag)
+                    # Still use the relative path format for consistency
+                    featured_image = f"/{img_rel_path}"
                 
-                else:
-                    # If all attempts failed, keep the placeholder but mark it
-                    modified_article = modified_article.replace(
-                        f"[IMAGE: {description}]", 
-                        f"<!-- Could not find image for: {description} -->"
-                    )
+                return img_tag, featured_image
+        
+        except Exception as e:
+            print(f"Error replacing image placeholder '{description}': {str(e)}")
+            # Mark the error in a comment
+            return f"<!-- Error finding image: {description} - {str(e)} -->", None
+    
+    def apply_image_results(self, article, descriptions, results, subject=None):
+        """
+        Replace placeholders with resolved images, in article order.
+        results holds one (img_tag, featured_image) tuple per description.
+        The first placeholder that produced a featured image candidate becomes the featured image.
+        """
+        featured_image = None
+        
+        if not descriptions:
+            # If no placeholders found, try to use an existing image from assets (on the subject if known)
+            existing_images = self.find_existing_images_in_assets(1, subject)
+            if existing_images:
+                featured_image = existing_images[0]
+            return article, featured_image
+        
+        modified_article = article
+        for description, (img_tag, candidate) in zip(descriptions, results):
+            if featured_image is None and candidate:
+                featured_image = candidate
             
-            except Exception as e:
-                print(f"Error replacing image placeholder '{description}': {str(e)}")
-                # Mark the error in a comment
-                modified_article = modified_article.replace(
-                    f"[IMAGE: {description}]", 
-                    f"<!-- Error finding image: {description} - {str(e)} -->"
-                )
+            # Replace the placeholder with the appropriate image tag
+            modified_article = modified_article.replace(f"[IMAGE: {description}]", img_tag)
+        
+        return modified_article, featured_image
+    
+    def replace_image_placeholders(self, article, subject, domain, parallel=PARALLEL_IMAGES, max_workers=IMAGE_WORKERS):
+        """
+        Replace image placeholders with real images.
+        With parallel, all placeholders are searched and downloaded at once on a bounded pool;
+        results are still applied in article order, so the featured image and file numbering don't change.
+        """
+        # Find all image placeholders
+        image_descriptions = self.find_image_placeholders(article)
+        
+        if parallel and len(image_descriptions) > 1:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(image_descriptions))) as executor:
+                futures = [
+                    executor.submit(self.resolve_image_placeholder, description, subject, domain, i)
+                    for i, description in enumerate(image_descriptions)
+                ]
+                results = [future.result() for future in futures]
+        else:
+            # Resolve each placeholder in turn
+            results = []
+            for i, description in enumerate(image_descriptions):
+                results.append(self.resolve_image_placeholder(description, subject, domain, i))
         
-        return modified_article, featured_image
\ No newline at end of file
+        return self.apply_image_results(article, image_descriptions, results, subject)
\ No newline at end of file
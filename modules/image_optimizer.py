@@ -0,0 +1,206 @@
+import os
+import re
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from modules.settings import (
+    IMAGES_FOLDER, IMAGE_OPTIMIZE_ENABLED, IMAGE_WIDTHS, IMAGE_WEBP_QUALITY, IMAGE_JPEG_QUALITY,
+    IMAGE_OPTIMIZE_WORKERS, IMAGE_VARIANTS_FILE
+)
+
+# Pillow is only needed for optimization; without it images are used as downloaded
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+def _save_image(image, path, image_format, **options):
+    """
+    Encode an image to a temp file and move it into place, so a file that is a hardlink into the
+    image store (or is being served) is replaced rather than overwritten
+    """
+    temp_path = f"{path}.tmp"
+    image.save(temp_path, image_format, **options)
+    os.replace(temp_path, path)
+
+def optimize_image(image_path, widths=IMAGE_WIDTHS, webp_quality=IMAGE_WEBP_QUALITY, jpeg_quality=IMAGE_JPEG_QUALITY):
+    """
+    Resize an image to each configured width (never upscaling) and encode every size as WebP and JPEG.
+    The largest JPEG replaces the original file, so existing links to it keep working.
+    Runs in a worker process; returns the dimensions and file paths of every variant.
+    """
+    with Image.open(image_path) as source:
+        image = ImageOps.exif_transpose(source)
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    
+    original_width, original_height = image.size
+    largest_width = min(original_width, max(widths))
+    target_widths = sorted({width for width in widths if width < largest_width} | {largest_width})
+    
+    base_path = os.path.splitext(image_path)[0]
+    variants = []
+    for width in target_widths:
+        height = max(1, round(original_height * width / original_width))
+        resized = image if width == original_width else image.resize((width, height), Image.LANCZOS)
+        
+        webp_path = f"{base_path}-{width}w.webp"
+        _save_image(resized, webp_path, "WEBP", quality=webp_quality, method=6)
+        
+        # JPEG has no transparency, so flatten onto white
+        if has_alpha:
+            background = Image.new("RGB", resized.size, (255, 255, 255))
+            background.paste(resized, mask=resized.split()[-1])
+            resized = background
+        
+        jpeg_path = image_path if width == largest_width else f"{base_path}-{width}w.jpg"
+        _save_image(resized, jpeg_path, "JPEG", quality=jpeg_quality, optimize=True, progressive=True)
+        
+        variants.append({"width": width, "height": height, "webp": webp_path, "jpeg": jpeg_path})
+    
+    return {"width": largest_width, "height": variants[-1]["height"], "variants": variants}
+
+def load_image_variants(manifest_file=IMAGE_VARIANTS_FILE):
+    """
+    Load the variants manifest (site path of each optimized image -> dimensions and variants).
+    The manifest is a log with one JSON line per optimized image; the last line for an image wins.
+    """
+    manifest = {}
+    if os.path.exists(manifest_file):
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Blank, or cut short by a crash while being appended
+                        continue
+                    manifest[entry.pop("src")] = entry
+        except Exception as e:
+            print(f"Error loading image variants: {str(e)}")
+    return manifest
+
+def find_image_variants(src, manifest):
+    """
+    Find the manifest entry for an image path, which may be the original or any of its variants
+    """
+    # Featured images are sometimes written with a doubled leading slash
+    src = "/" + src.lstrip("/")
+    if src in manifest:
+        return manifest[src]
+    
+    for info in manifest.values():
+        for variant in info["variants"]:
+            if src in (variant["webp"], variant["jpeg"]):
+                return info
+    return None
+
+def render_picture_tag(src, alt, info):
+    """
+    Build a <picture> element with a WebP srcset, a JPEG fallback srcset and explicit dimensions
+    """
+    webp_srcset = ", ".join(f"{variant['webp']} {variant['width']}w" for variant in info["variants"])
+    jpeg_srcset = ", ".join(f"{variant['jpeg']} {variant['width']}w" for variant in info["variants"])
+    largest = info["variants"][-1]
+    sizes = f"(max-width: {info['width']}px) 100vw, {info['width']}px"
+    
+    return (
+        f'<picture>'
+        f'<source type="image/webp" srcset="{webp_srcset}" sizes="{sizes}">'
+        f'<img src="{largest["jpeg"]}" srcset="{jpeg_srcset}" sizes="{sizes}" alt="{alt}" '
+        f'width="{info["width"]}" height="{info["height"]}" loading="lazy">'
+        f'</picture>'
+    )
+
+def add_responsive_images(html, manifest):
+    """
+    Replace <img> tags of optimized images with <picture> elements using their variants
+    """
+    if not manifest:
+        return html
+    
+    def replace(match):
+        tag = match.group(0)
+        src = re.search(r'src="([^"]*)"', tag)
+        alt = re.search(r'alt="([^"]*)"', tag)
+        info = find_image_variants(src.group(1), manifest) if src else None
+        if not info:
+            return tag
+        return render_picture_tag(src.group(1), alt.group(1) if alt else "", info)
+    
+    return re.sub(r'<img\b[^>]*>', replace, html)
+
+class ImageOptimizer:
+    def __init__(self, images_folder=IMAGES_FOLDER, workers=IMAGE_OPTIMIZE_WORKERS, manifest_file=IMAGE_VARIANTS_FILE):
+        """
+        Optimizes downloaded images in a process pool, so encoding doesn't hold up downloads,
+        and records every image's variants in a manifest used when rendering HTML.
+        The manifest is appended to (one line per image) and lives outside the images folder.
+        """
+        self.images_folder = images_folder
+        self.manifest_file = manifest_file
+        self.enabled = IMAGE_OPTIMIZE_ENABLED and Image is not None
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        
+        if os.path.dirname(self.manifest_file):
+            os.makedirs(os.path.dirname(self.manifest_file), exist_ok=True)
+        self.manifest = load_image_variants(self.manifest_file)
+        
+        if IMAGE_OPTIMIZE_ENABLED and Image is None:
+            print("Pillow is not installed, images will be used without optimization")
+    
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+    
+    def _append_manifest(self, src, info):
+        """
+        Record one image's variants (a single appended line instead of rewriting the manifest)
+        """
+        try:
+            with open(self.manifest_file, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(dict(info, src=src)) + '\n')
+        except Exception as e:
+            print(f"Error saving image variants: {str(e)}")
+    
+    def _site_path(self, path):
+        return "/" + path.replace(os.sep, "/").lstrip("/")
+    
+    def optimize(self, image_path):
+        """
+        Optimize a saved image and return its manifest entry (site paths and dimensions),
+        or None if optimization is off or failed (the original file is then left untouched)
+        """
+        if not self.enabled:
+            return None
+        
+        try:
+            result = self._get_executor().submit(optimize_image, image_path).result()
+        except Exception as e:
+            print(f"Error optimizing image {image_path}: {str(e)}")
+            return None
+        
+        info = {
+            "width": result["width"],
+            "height": result["height"],
+            "variants": [
+                {
+                    "width": variant["width"],
+                    "height": variant["height"],
+                    "webp": self._site_path(variant["webp"]),
+                    "jpeg": self._site_path(variant["jpeg"])
+                }
+                for variant in result["variants"]
+            ]
+        }
+        
+        with self._lock:
+            self.manifest[self._site_path(image_path)] = info
+            self._append_manifest(self._site_path(image_path), info)
+        
+        return info
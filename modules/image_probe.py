@@ -0,0 +1,75 @@
+import struct
+
+def sniff_image_type(data):
+    """
+    Detect the image format from the first bytes of a file (magic bytes).
+    Returns "jpeg", "png", "gif" or "webp", or None if the data isn't a supported image
+    (e.g. an HTML error page served with an image URL).
+    """
+    if data.startswith(b'\xff\xd8\xff'):
+        return "jpeg"
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return "png"
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return "gif"
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return "webp"
+    return None
+
+def get_image_dimensions(data, image_type=None):
+    """
+    Read the (width, height) of an image from its header bytes, or None if they aren't
+    in the data (e.g. a JPEG whose size marker comes after a large EXIF block)
+    """
+    image_type = image_type or sniff_image_type(data)
+    
+    try:
+        if image_type == "png" and len(data) >= 24:
+            return struct.unpack('>II', data[16:24])
+        
+        if image_type == "gif" and len(data) >= 10:
+            return struct.unpack('<HH', data[6:10])
+        
+        if image_type == "webp" and len(data) >= 30:
+            chunk = data[12:16]
+            if chunk == b'VP8 ':
+                width, height = struct.unpack('<HH', data[26:30])
+                return width & 0x3fff, height & 0x3fff
+            if chunk == b'VP8L':
+                bits = int.from_bytes(data[21:25], 'little')
+                return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+            if chunk == b'VP8X':
+                return int.from_bytes(data[24:27], 'little') + 1, int.from_bytes(data[27:30], 'little') + 1
+        
+        if image_type == "jpeg":
+            # Walk the markers until a start-of-frame marker, which holds the dimensions
+            position = 2
+            while position + 9 < len(data):
+                if data[position] != 0xff:
+                    position += 1
+                    continue
+                
+                marker = data[position + 1]
+                if marker in (0xd8, 0x01) or 0xd0 <= marker <= 0xd7 or marker == 0xff:
+                    position += 1 if marker == 0xff else 2
+                    continue
+                
+                length = struct.unpack('>H', data[position + 2:position + 4])[0]
+                if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+                    height, width = struct.unpack('>HH', data[position + 5:position + 9])
+                    return width, height
+                position += 2 + length
+    except struct.error:
+        pass
+    
+    return None
+
+def parse_content_range_total(content_range):
+    """
+    Get the full size from a Content-Range header ("bytes 0-65535/1234567"), or None if unknown
+    """
+    if content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1].strip()
+        if total.isdigit():
+            return int(total)
+    return None
@@ -0,0 +1,188 @@
+import re
+import time
+import threading
+from urllib.parse import quote_plus
+from modules.settings import (
+    IMAGE_PROVIDER_RESULTS, IMAGE_PROVIDER_FAILURE_THRESHOLD, IMAGE_PROVIDER_COOLDOWN, IMAGE_PROVIDER_MAX_MATCH
+)
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=IMAGE_PROVIDER_FAILURE_THRESHOLD, cooldown=IMAGE_PROVIDER_COOLDOWN):
+        """
+        Stops calls to a provider after repeated failures, then lets a single trial request
+        through once the cool-down has passed (closed -> open -> half-open -> closed)
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+    
+    def allow_request(self):
+        """
+        Check whether a request may be sent now
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            
+            # Half-open: one trial request after the cool-down decides whether to close again
+            if time.monotonic() - self.opened_at >= self.cooldown and not self.trial_in_progress:
+                self.trial_in_progress = True
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_progress = False
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_in_progress or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_progress = False
+    
+    def get_state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                return "half-open"
+            return "open"
+
+def extract_urls(chunks, patterns, limit, max_match=IMAGE_PROVIDER_MAX_MATCH):
+    """
+    Extract image URLs (group 1 of each pattern) from a stream of text chunks, scanning only the
+    new text after each chunk and stopping as soon as the first pattern has found limit URLs.
+    patterns holds (compiled regex, url_filter or None) pairs in order of preference: the URLs of
+    the first pattern with any matches are returned. Matches are assumed to be shorter than max_match.
+    """
+    results = [[] for _ in patterns]
+    positions = [0] * len(patterns)
+    buffer = ""
+    
+    for chunk in chunks:
+        buffer += chunk
+        
+        for index, (pattern, url_filter) in enumerate(patterns):
+            if len(results[index]) >= limit:
+                positions[index] = len(buffer)
+                continue
+            
+            for match in pattern.finditer(buffer, positions[index]):
+                positions[index] = match.end()
+                url = match.group(1)
+                if (url_filter is None or url_filter(url)) and url not in results[index]:
+                    results[index].append(url)
+                    if len(results[index]) >= limit:
+                        break
+            
+            # Text before this point can't start a match that is still incomplete
+            positions[index] = max(positions[index], len(buffer) - max_match)
+        
+        if len(results[0]) >= limit:
+            break
+        
+        # Drop the text every pattern is done with
+        trim = min(positions)
+        if trim > 0:
+            buffer = buffer[trim:]
+            positions = [position - trim for position in positions]
+    
+    for urls in results:
+        if urls:
+            return urls[:limit]
+    return []
+
+class ImageProvider:
+    def __init__(self, name, source, url_template, patterns, headers=None):
+        """
+        An image search provider: how to build its search URL (url_template with a {query} field)
+        and how to extract image URLs from the results page. patterns are regexes, most specific
+        first, each optionally paired with a filter as (regex, url_filter).
+        """
+        self.name = name
+        self.source = source
+        self.url_template = url_template
+        self.patterns = [
+            (re.compile(pattern[0]), pattern[1]) if isinstance(pattern, tuple) else (re.compile(pattern), None)
+            for pattern in patterns
+        ]
+        self.headers = headers or {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+        self.breaker = CircuitBreaker()
+    
+    def build_url(self, query):
+        return self.url_template.format(query=quote_plus(query))
+    
+    def search(self, transport, query, timeout=None, limit=IMAGE_PROVIDER_RESULTS):
+        """
+        Fetch the results page as a stream and extract up to limit image URLs, without reading
+        the rest of the page once enough are found. Returns [] if the breaker is open.
+        Errors and empty pages (usually a block or captcha) count as failures for the breaker.
+        """
+        if not self.breaker.allow_request():
+            return []
+        
+        try:
+            response = transport.get(self.build_url(query), kind="search", headers=self.headers, stream=True, timeout=timeout)
+            with response:
+                response.raise_for_status()
+                if response.encoding is None:
+                    response.encoding = 'utf-8'
+                
+                chunks = response.iter_content(chunk_size=16384, decode_unicode=True)
+                urls = extract_urls(chunks, self.patterns, limit)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        
+        if urls:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        return urls
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+def register_provider(provider):
+    """
+    Add a provider to the registry (replacing one with the same name)
+    """
+    with _providers_lock:
+        _providers[provider.name] = provider
+    return provider
+
+def get_provider(name):
+    with _providers_lock:
+        return _providers.get(name)
+
+def get_providers(names=None):
+    """
+    Get registered providers, in the given order (all providers in registration order if None)
+    """
+    with _providers_lock:
+        if names is None:
+            return list(_providers.values())
+        return [_providers[name] for name in names if name in _providers]
+
+register_provider(ImageProvider(
+    "bing", "Bing",
+    "https://www.bing.com/images/search?q={query}&first=1",
+    [r'murl&quot;:&quot;(.*?)&quot;']
+))
+
+register_provider(ImageProvider(
+    "yahoo", "Yahoo",
+    "https://images.search.yahoo.com/search/images?p={query}",
+    [
+        r'<img[^>]+src="([^"]+)"[^>]*class="process[^>]*>',
+        r'<img[^>]+data-src="([^"]+)"[^>]*class="process[^>]*>',
+        # Catch-all, minus icons and logos
+        (r'<img[^>]+src="([^"]+)"[^>]*>', lambda url: not ('icon' in url.lower() or 'logo' in url.lower()))
+    ]
+))
@@ -0,0 +1,210 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+from modules.settings import (
+    IMAGE_QUEUE_FILE, IMAGE_QUEUE_WORKERS, IMAGE_QUEUE_MAX_ATTEMPTS, IMAGE_QUEUE_POLL_INTERVAL, IMAGE_QUEUE_STALE_AFTER
+)
+
+# Placeholders are written into deferred posts as HTML comments, so they don't show on the site
+DEFERRED_PLACEHOLDER = "<!-- IMAGE: {description} -->"
+DEFERRED_PLACEHOLDER_PATTERN = r'<!-- IMAGE: (.*?) -->'
+
+def stub_image_placeholders(article):
+    """
+    Turn [IMAGE: ...] placeholders into invisible comments until the images are resolved
+    """
+    return re.sub(r'\[IMAGE: (.*?)\]', lambda match: DEFERRED_PLACEHOLDER.format(description=match.group(1)), article)
+
+def unstub_image_placeholders(article):
+    return re.sub(DEFERRED_PLACEHOLDER_PATTERN, lambda match: f"[IMAGE: {match.group(1)}]", article)
+
+def set_featured_image(markdown_content, featured_image):
+    """
+    Set the image: field of a post's frontmatter (added after layout: if missing)
+    """
+    if not markdown_content.startswith('---\n'):
+        return markdown_content
+    
+    end = markdown_content.find('\n---\n', 4)
+    if end == -1:
+        return markdown_content
+    
+    header, body = markdown_content[:end], markdown_content[end:]
+    image_line = f"image: {featured_image}"
+    
+    if re.search(r'^image: .*$', header, flags=re.M):
+        header = re.sub(r'^image: .*$', lambda match: image_line, header, count=1, flags=re.M)
+    elif re.search(r'^layout: .*$', header, flags=re.M):
+        header = re.sub(r'^(layout: .*)$', lambda match: f"{match.group(1)}\n{image_line}", header, count=1, flags=re.M)
+    else:
+        header += f"\n{image_line}"
+    
+    return header + body
+
+class ImageQueue:
+    def __init__(self, image_manager, path=IMAGE_QUEUE_FILE, workers=IMAGE_QUEUE_WORKERS):
+        """
+        Persistent queue of posts whose images still need resolving, drained by background workers.
+        Each job resolves the placeholders of one post, then atomically rewrites the post and its
+        image: frontmatter. Jobs survive restarts. Several queues (one per app session) may share
+        the file: jobs are claimed atomically, and a job is only taken over from another worker
+        once its claim is older than IMAGE_QUEUE_STALE_AFTER (its worker has most likely died).
+        """
+        self.image_manager = image_manager
+        self.path = path
+        self.workers = workers
+        
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._threads = []
+        
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        
+        connection = self._connect()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, file_path TEXT NOT NULL, subject TEXT NOT NULL, "
+            "domain TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "error TEXT, created REAL NOT NULL, updated REAL NOT NULL, claimed_at REAL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+        connection.commit()
+    
+    def _connect(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+    
+    def start(self):
+        """
+        Start the worker threads (once)
+        """
+        if self._threads:
+            return
+        
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def enqueue(self, file_path, subject, domain):
+        """
+        Queue a written post for image resolution
+        """
+        now = time.time()
+        connection = self._connect()
+        connection.execute(
+            "INSERT INTO jobs (file_path, subject, domain, status, created, updated) VALUES (?, ?, ?, 'pending', ?, ?)",
+            (file_path, subject, domain, now, now)
+        )
+        connection.commit()
+        
+        self.start()
+        self._wakeup.set()
+    
+    def get_status(self):
+        """
+        Get the number of jobs per status ("pending", "running", "done", "failed")
+        """
+        connection = self._connect()
+        return dict(connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+    
+    def _claim(self):
+        """
+        Mark the oldest pending (or stale running) job as running and return it with its claim time,
+        or None if there is nothing to do. The update only succeeds if no other worker, in this or
+        another session, claimed the job in between.
+        """
+        connection = self._connect()
+        while True:
+            stale_before = time.time() - IMAGE_QUEUE_STALE_AFTER
+            row = connection.execute(
+                "SELECT id, file_path, subject, domain, attempts, status, claimed_at FROM jobs "
+                "WHERE status = 'pending' OR (status = 'running' AND claimed_at < ?) ORDER BY id LIMIT 1",
+                (stale_before,)
+            ).fetchone()
+            if row is None:
+                return None
+            
+            job_id, file_path, subject, domain, attempts, status, claimed_at = row
+            claimed_now = time.time()
+            cursor = connection.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, claimed_at = ?, updated = ? "
+                "WHERE id = ? AND status = ? AND claimed_at IS ?",
+                (claimed_now, claimed_now, job_id, status, claimed_at)
+            )
+            connection.commit()
+            
+            if cursor.rowcount == 1:
+                return job_id, file_path, subject, domain, attempts, claimed_now
+    
+    def _finish(self, job_id, claimed_at, status, error=None):
+        """
+        Record a job's outcome, unless another worker has taken the job over since it was claimed
+        """
+        connection = self._connect()
+        connection.execute(
+            "UPDATE jobs SET status = ?, error = ?, updated = ? WHERE id = ? AND claimed_at = ?",
+            (status, error, time.time(), job_id, claimed_at)
+        )
+        connection.commit()
+    
+    def _work(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                self._wakeup.wait(IMAGE_QUEUE_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            
+            job_id, file_path, subject, domain, attempts, claimed_at = job
+            last_attempt = attempts + 1 >= IMAGE_QUEUE_MAX_ATTEMPTS
+            try:
+                status = self.process(file_path, subject, domain)
+                if status == "pending" and last_attempt:
+                    self._finish(job_id, claimed_at, "failed", "Post kept changing while its images were resolved")
+                else:
+                    self._finish(job_id, claimed_at, status)
+            except Exception as e:
+                print(f"Error resolving images for {file_path}: {str(e)}")
+                self._finish(job_id, claimed_at, "failed" if last_attempt else "pending", str(e))
+    
+    def process(self, file_path, subject, domain):
+        """
+        Resolve the images of one post and rewrite it. Returns the job's new status:
+        "done", or "pending" if the post changed while its images were being resolved.
+        """
+        if not os.path.exists(file_path):
+            return "done"
+        
+        with open(file_path, 'r', encoding='utf-8') as file:
+            original = file.read()
+        
+        article = unstub_image_placeholders(original)
+        if not self.image_manager.find_image_placeholders(article):
+            return "done"
+        
+        # The frontmatter has no placeholders, so the whole file can go through the image pipeline
+        article_with_images, featured_image = self.image_manager.replace_image_placeholders(article, subject, domain)
+        if featured_image:
+            article_with_images = set_featured_image(article_with_images, featured_image)
+        
+        # Don't overwrite edits made while the images were being resolved; try again later instead
+        with open(file_path, 'r', encoding='utf-8') as file:
+            if file.read() != original:
+                return "pending"
+        
+        temp_path = f"{file_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(article_with_images)
+        os.replace(temp_path, file_path)
+        
+        return "done"
@@ -0,0 +1,84 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+from modules.disk_cache import DiskCache
+from modules.settings import IMAGE_STORE_FOLDER
+
+class ImageStore:
+    def __init__(self, store_folder=IMAGE_STORE_FOLDER):
+        """
+        Content-addressed image storage: every distinct image is stored once under its SHA-256,
+        with an index from source URL to hash so a known URL never needs downloading again.
+        The store lives outside the images folder, so it is never published or committed with the site.
+        The index is an SQLite table shared safely by every session, and each download adds one row.
+        """
+        self.root = store_folder
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self.index = DiskCache(os.path.join(self.root, "index.sqlite"))
+    
+    def _blob_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+    
+    def get_by_url(self, url):
+        """
+        Get the stored file for a source URL, or None if it was never downloaded
+        """
+        digest = self.index.get(url)
+        blob = self._blob_path(digest) if digest else None
+        
+        if blob and os.path.exists(blob):
+            return blob
+        return None
+    
+    def save(self, url, chunks):
+        """
+        Store downloaded bytes (an iterable of chunks) and index them under the source URL.
+        Returns the path of the stored file; identical bytes from another URL reuse the existing file.
+        """
+        sha256 = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in chunks:
+                    if chunk:
+                        sha256.update(chunk)
+                        temp_file.write(chunk)
+            
+            digest = sha256.hexdigest()
+            blob = self._blob_path(digest)
+            
+            with self._lock:
+                if os.path.exists(blob):
+                    os.remove(temp_path)
+                else:
+                    os.makedirs(os.path.dirname(blob), exist_ok=True)
+                    os.replace(temp_path, blob)
+                
+                self.index.set(url, digest)
+            
+            return blob
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    
+    def link(self, blob, target_path):
+        """
+        Expose a stored file under another name: a hardlink if possible, and a plain copy otherwise
+        (e.g. the store is on another file system). A symlink would point outside the site.
+        """
+        temp_target = f"{target_path}.tmp"
+        if os.path.lexists(temp_target):
+            os.remove(temp_target)
+        
+        try:
+            os.link(blob, temp_target)
+        except OSError:
+            shutil.copyfile(blob, temp_target)
+        
+        # Swap in the new link atomically, replacing an older file with the same name
+        os.replace(temp_target, target_path)
+        return target_path
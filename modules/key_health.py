@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import hashlib
+import datetime
+import threading
+from modules.settings import (
+    KEY_HEALTH_FILE, KEY_HEALTH_WINDOW, KEY_HEALTH_429_THRESHOLD,
+    KEY_QUARANTINE_BASE, KEY_QUARANTINE_MAX, KEY_QUARANTINE_INVALID
+)
+
+class KeyHealthTracker:
+    def __init__(self, state_file=KEY_HEALTH_FILE):
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        self.keys = self._load_state()
+    
+    def _load_state(self):
+        """
+        Load key health state from the JSON file
+        """
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as file:
+                    return json.load(file)
+            except Exception as e:
+                print(f"Error loading key health state: {str(e)}")
+        return {}
+    
+    def _save_state(self):
+        """
+        Save key health state to the JSON file (written to a temp file first so a crash can't corrupt it)
+        """
+        try:
+            temp_file = f"{self.state_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as file:
+                json.dump(self.keys, file, indent=2)
+            os.replace(temp_file, self.state_file)
+        except Exception as e:
+            print(f"Error saving key health state: {str(e)}")
+    
+    def _key_id(self, api_key):
+        """
+        Identify a key by a hash so the raw key is never written to the state file
+        """
+        return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+    
+    def _get_entry(self, api_key):
+        key_id = self._key_id(api_key)
+        if key_id not in self.keys:
+            self.keys[key_id] = {
+                "successes": 0,
+                "failures": 0,
+                "success_rate": 1.0,
+                "latency": None,
+                "consecutive_failures": 0,
+                "recent_429": [],
+                "recent_403": [],
+                "quarantine_count": 0,
+                "quarantined_until": 0,
+                "last_error": None
+            }
+        return self.keys[key_id]
+    
+    def _quarantine(self, entry, seconds, reason):
+        entry["quarantine_count"] += 1
+        entry["quarantined_until"] = max(entry["quarantined_until"], time.time() + seconds)
+        entry["last_error"] = reason
+    
+    def _seconds_until_daily_reset(self):
+        """
+        Get the seconds until Gemini daily quotas reset (midnight Pacific time)
+        """
+        try:
+            from zoneinfo import ZoneInfo
+            now = datetime.datetime.now(ZoneInfo("America/Los_Angeles"))
+        except Exception:
+            return 24 * 3600
+        
+        tomorrow = (now + datetime.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return (tomorrow - now).total_seconds()
+    
+    def record_success(self, api_key, latency):
+        """
+        Record a successful request and its latency (seconds)
+        """
+        with self._lock:
+            entry = self._get_entry(api_key)
+            entry["successes"] += 1
+            entry["success_rate"] = entry["success_rate"] * 0.8 + 0.2
+            entry["latency"] = latency if entry["latency"] is None else entry["latency"] * 0.8 + latency * 0.2
+            entry["consecutive_failures"] = 0
+            
+            # Cool-downs only keep growing while a key keeps getting quarantined; once it has worked
+            # for a whole window after its last quarantine, the next one starts short again
+            if entry["quarantine_count"] and time.time() - entry["quarantined_until"] >= KEY_HEALTH_WINDOW:
+                entry["quarantine_count"] = 0
+            
+            # Successes only change ranking, so don't rewrite the file on every one
+            if entry["successes"] % 10 == 1:
+                self._save_state()
+    
+    def record_failure(self, api_key, status_code=None, error_text=""):
+        """
+        Record a failed request and quarantine the key if it looks exhausted or revoked.
+        Only failures caused by the key itself count (401/403, invalid key, 429): network errors,
+        timeouts, 5xx and empty responses are left to retries and backoff, so an outage can't
+        lock out every key.
+        """
+        error_lower = (error_text or "").lower()
+        if not (status_code in (401, 403, 429) or (status_code == 400 and "api key" in error_lower)):
+            return
+        
+        with self._lock:
+            now = time.time()
+            entry = self._get_entry(api_key)
+            entry["failures"] += 1
+            entry["success_rate"] = entry["success_rate"] * 0.8
+            entry["consecutive_failures"] += 1
+            
+            # Only keep the error timestamps inside the tracking window
+            entry["recent_429"] = [t for t in entry["recent_429"] if now - t < KEY_HEALTH_WINDOW]
+            entry["recent_403"] = [t for t in entry["recent_403"] if now - t < KEY_HEALTH_WINDOW]
+            
+            if status_code in (401, 403) or (status_code == 400 and "api key" in error_lower):
+                # Revoked, disabled or invalid key
+                entry["recent_403"].append(now)
+                self._quarantine(entry, KEY_QUARANTINE_INVALID, f"HTTP {status_code}")
+            
+            elif status_code == 429:
+                entry["recent_429"].append(now)
+                
+                if "per day" in error_lower or "perday" in error_lower:
+                    # Daily quota exhausted, nothing will work until the quota resets
+                    self._quarantine(entry, self._seconds_until_daily_reset(), "Daily quota exhausted")
+                elif len(entry["recent_429"]) >= KEY_HEALTH_429_THRESHOLD:
+                    # Repeated rate limiting, cool down longer each time it happens
+                    cooldown = min(KEY_QUARANTINE_MAX, KEY_QUARANTINE_BASE * (2 ** entry["quarantine_count"]))
+                    self._quarantine(entry, cooldown, "Repeated rate limiting")
+                    entry["recent_429"] = []
+            
+            self._save_state()
+    
+    def is_available(self, api_key):
+        """
+        Check whether a key is outside of quarantine
+        """
+        with self._lock:
+            return self._get_entry(api_key)["quarantined_until"] <= time.time()
+    
+    def get_available_at(self, api_key):
+        """
+        Get the time a key comes out of quarantine (in the past if it isn't quarantined)
+        """
+        with self._lock:
+            return self._get_entry(api_key)["quarantined_until"]
+    
+    def get_score(self, api_key):
+        """
+        Get a health score for a key (higher is healthier)
+        """
+        with self._lock:
+            entry = self._get_entry(api_key)
+            latency_penalty = min(0.5, (entry["latency"] or 0) / 120)
+            return entry["success_rate"] - latency_penalty
+    
+    def get_status(self, api_key):
+        """
+        Get a summary of a key's health for display
+        """
+        with self._lock:
+            entry = dict(self._get_entry(api_key))
+        
+        remaining = entry["quarantined_until"] - time.time()
+        entry["quarantined"] = remaining > 0
+        entry["quarantine_remaining"] = max(0, int(remaining))
+        return entry
@@ -0,0 +1,316 @@
+import json
+import time
+import random
+import hashlib
+import requests
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from modules.http_transport import get_transport
+from modules.disk_cache import DiskCache
+from modules.settings import (
+    LLM_BACKENDS, WAIT_TIME_BETWEEN_REQUESTS,
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_FILE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BYTES
+)
+
+class LLMBackend(ABC):
+    """
+    Interface the article generator talks to. Implementations must provide send_request;
+    send_batch and stream_request have generic fallbacks.
+    """
+    name = "backend"
+    
+    @abstractmethod
+    def send_request(self, prompt, model=None, max_retries=5, use_cache=True, generation_config=None, stage=None):
+        """
+        Send a prompt and return the response text
+        """
+    
+    def get_max_concurrency(self):
+        return 1
+    
+    def send_batch(self, prompts, model=None, max_retries=5, max_workers=None, use_cache=True,
+                   generation_config=None, stage=None):
+        """
+        Send several prompts concurrently.
+        Returns one {"text", "error"} dict per prompt, in the same order as the prompts.
+        """
+        results = [None] * len(prompts)
+        if not prompts:
+            return results
+        
+        workers = max_workers or self.get_max_concurrency()
+        with ThreadPoolExecutor(max_workers=min(workers, len(prompts))) as executor:
+            futures = {
+                executor.submit(self.send_request, prompt, model, max_retries, use_cache, generation_config, stage): index
+                for index, prompt in enumerate(prompts)
+            }
+            
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    results[index] = {"text": future.result(), "error": None}
+                except Exception as e:
+                    results[index] = {"text": None, "error": str(e)}
+        
+        return results
+    
+    def stream_request(self, prompt, model=None, max_retries=5, use_cache=True, generation_config=None):
+        """
+        Yield the response in chunks (backends without streaming yield it in one piece)
+        """
+        yield self.send_request(prompt, model, max_retries, use_cache, generation_config)
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+    
+    def __init__(self, client):
+        self.client = client
+    
+    def send_request(self, prompt, model=None, max_retries=5, use_cache=True, generation_config=None, stage=None):
+        return self.client.send_request(prompt, model or "gemini-1.5-flash", max_retries, use_cache, generation_config, stage)
+    
+    def send_batch(self, prompts, model=None, max_retries=5, max_workers=None, use_cache=True,
+                   generation_config=None, stage=None):
+        return self.client.send_batch(prompts, model or "gemini-1.5-flash", max_retries, max_workers, use_cache,
+                                      generation_config, stage)
+    
+    def stream_request(self, prompt, model=None, max_retries=5, use_cache=True, generation_config=None):
+        return self.client.stream_request(prompt, model or "gemini-1.5-flash", max_retries, use_cache, generation_config)
+    
+    def get_max_concurrency(self):
+        return self.client.get_max_concurrency()
+
+class OpenAICompatibleBackend(LLMBackend):
+    name = "openai"
+    
+    def __init__(self, base_url, model, api_key=None, max_concurrency=4):
+        """
+        Backend for any server exposing an OpenAI-compatible /v1/chat/completions endpoint.
+        The Gemini model names passed by the generator are ignored in favor of the configured model.
+        """
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.transport = get_transport()
+        self.response_cache = DiskCache(RESPONSE_CACHE_FILE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BYTES) if RESPONSE_CACHE_ENABLED else None
+    
+    def get_max_concurrency(self):
+        return self.max_concurrency
+    
+    def build_request_data(self, prompt, generation_config=None, stream=False):
+        """
+        Build the chat completions request body, mapping the Gemini generationConfig options
+        """
+        config = {"temperature": 0.7, "topP": 0.95, "maxOutputTokens": 8192}
+        config.update(generation_config or {})
+        
+        data = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": config["temperature"],
+            "top_p": config["topP"],
+            "max_tokens": config["maxOutputTokens"]
+        }
+        
+        if config.get("responseMimeType") == "application/json":
+            data["response_format"] = {"type": "json_object"}
+        if stream:
+            data["stream"] = True
+        
+        return data
+    
+    def _get_headers(self):
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+    
+    def _is_permanent_error(self, error):
+        """
+        Check whether a failed request would fail the same way again (a 4xx other than 408/429:
+        bad request, bad key, unknown model)
+        """
+        if not isinstance(error, requests.exceptions.HTTPError) or error.response is None:
+            return False
+        status_code = error.response.status_code
+        return 400 <= status_code < 500 and status_code not in (408, 429)
+    
+    def _get_cache_key(self, data):
+        cache_source = json.dumps({"backend": self.base_url, **data}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(cache_source.encode('utf-8')).hexdigest()
+    
+    def send_request(self, prompt, model=None, max_retries=5, use_cache=True, generation_config=None, stage=None):
+        """
+        Send a request to the chat completions endpoint
+        """
+        data = self.build_request_data(prompt, generation_config)
+        cache_key = self._get_cache_key(data) if use_cache and self.response_cache else None
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        url = f"{self.base_url}/v1/chat/completions"
+        last_error = None
+        
+        for attempt in range(max_retries):
+            try:
+                response = self.transport.post(url, kind="llm", headers=self._get_headers(), json=data)
+                response.raise_for_status()
+                choices = response.json().get("choices", [])
+                
+                if choices and choices[0].get("message", {}).get("content"):
+                    text = choices[0]["message"]["content"]
+                    if cache_key:
+                        self.response_cache.set(cache_key, text)
+                    return text
+                
+                last_error = "Empty response"
+            except Exception as e:
+                if self._is_permanent_error(e):
+                    raise
+                last_error = str(e)
+            
+            if attempt < max_retries - 1:
+                time.sleep(WAIT_TIME_BETWEEN_REQUESTS)
+        
+        raise Exception(f"Failed to get response from {self.base_url} after {max_retries} attempts: {last_error}")
+    
+    def stream_request(self, prompt, model=None, max_retries=5, use_cache=True, generation_config=None):
+        """
+        Stream a chat completion and yield text chunks as they arrive.
+        Failures are retried until the first chunk has been yielded; after that they are raised.
+        A cached response (shared with send_request) is yielded in one piece.
+        """
+        data = self.build_request_data(prompt, generation_config, stream=True)
+        
+        # Cache under the non-streaming request so both methods share entries
+        cache_key = self._get_cache_key(self.build_request_data(prompt, generation_config)) if use_cache and self.response_cache else None
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        url = f"{self.base_url}/v1/chat/completions"
+        last_error = None
+        
+        for attempt in range(max_retries):
+            streamed_parts = []
+            try:
+                response = self.transport.post(url, kind="llm", headers=self._get_headers(), json=data, stream=True)
+                response.raise_for_status()
+                
+                with response:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith("data:"):
+                            continue
+                        
+                        payload = line[len("data:"):].strip()
+                        if payload == "[DONE]":
+                            break
+                        
+                        for choice in json.loads(payload).get("choices", []):
+                            content = choice.get("delta", {}).get("content")
+                            if content:
+                                streamed_parts.append(content)
+                                yield content
+                
+                if streamed_parts:
+                    if cache_key:
+                        self.response_cache.set(cache_key, "".join(streamed_parts))
+                    return
+                
+                last_error = "Empty response"
+            except Exception as e:
+                if streamed_parts:
+                    raise Exception(f"Stream interrupted: {str(e)}")
+                if self._is_permanent_error(e):
+                    raise
+                last_error = str(e)
+            
+            if attempt < max_retries - 1:
+                time.sleep(WAIT_TIME_BETWEEN_REQUESTS)
+        
+        raise Exception(f"Failed to get response from {self.base_url} after {max_retries} attempts: {last_error}")
+
+class BackendPool(LLMBackend):
+    name = "pool"
+    
+    def __init__(self, backends):
+        """
+        Split traffic over several backends. backends is a list of (backend, weight) pairs;
+        a failed request is retried on the other backends before giving up.
+        """
+        self.backends = [(backend, weight) for backend, weight in backends if weight > 0]
+        if not self.backends:
+            raise Exception("No LLM backends configured")
+    
+    def _get_order(self):
+        """
+        Pick a backend by weight, followed by the remaining backends as fallbacks
+        """
+        backends = [backend for backend, _ in self.backends]
+        weights = [weight for _, weight in self.backends]
+        chosen = random.choices(backends, weights=weights)[0]
+        return [chosen] + [backend for backend in backends if backend is not chosen]
+    
+    def get_max_concurrency(self):
+        return sum(backend.get_max_concurrency() for backend, _ in self.backends)
+    
+    def send_request(self, prompt, model=None, max_retries=5, use_cache=True, generation_config=None, stage=None):
+        last_error = None
+        for backend in self._get_order():
+            try:
+                return backend.send_request(prompt, model, max_retries, use_cache, generation_config, stage)
+            except Exception as e:
+                print(f"Backend {backend.name} failed: {str(e)}")
+                last_error = e
+        raise last_error
+    
+    def send_batch(self, prompts, model=None, max_retries=5, max_workers=None, use_cache=True,
+                   generation_config=None, stage=None):
+        # With a single backend keep its own batching (e.g. Gemini's key-aware scheduling)
+        if len(self.backends) == 1:
+            return self.backends[0][0].send_batch(prompts, model, max_retries, max_workers, use_cache,
+                                                  generation_config, stage)
+        return super().send_batch(prompts, model, max_retries, max_workers, use_cache, generation_config, stage)
+    
+    def stream_request(self, prompt, model=None, max_retries=5, use_cache=True, generation_config=None):
+        """
+        Stream from a backend picked by weight, falling back to the others if it fails before
+        producing any text (once text has been yielded a failure is raised)
+        """
+        last_error = None
+        for backend in self._get_order():
+            yielded_text = False
+            try:
+                for chunk in backend.stream_request(prompt, model, max_retries, use_cache, generation_config):
+                    yielded_text = True
+                    yield chunk
+                return
+            except Exception as e:
+                if yielded_text:
+                    raise
+                print(f"Backend {backend.name} failed: {str(e)}")
+                last_error = e
+        raise last_error
+
+def create_backend_pool(gemini_client, backend_configs=None):
+    """
+    Build the backend pool from LLM_BACKENDS settings
+    """
+    backends = []
+    for config in backend_configs or LLM_BACKENDS:
+        backend_type = config.get("type", "gemini")
+        if backend_type == "gemini":
+            backend = GeminiBackend(gemini_client)
+        elif backend_type == "openai":
+            backend = OpenAICompatibleBackend(
+                config["base_url"], config["model"], config.get("api_key"), config.get("max_concurrency", 4)
+            )
+        else:
+            raise Exception(f"Unknown LLM backend type: {backend_type}")
+        backends.append((backend, config.get("weight", 1)))
+    return BackendPool(backends)
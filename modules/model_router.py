@@ -0,0 +1,100 @@
+import time
+import threading
+from modules.settings import (
+    MODEL_CHAINS, FALLBACK_MODEL, MODEL_DEGRADED_FAILURES, MODEL_DEGRADED_COOLDOWN,
+    MODEL_ERROR_RATE_THRESHOLD, MODEL_QUOTA_COOLDOWN
+)
+
+class ModelRouter:
+    def __init__(self, chains=None):
+        self.chains = chains or MODEL_CHAINS
+        self._lock = threading.Lock()
+        self.models = {}
+    
+    def _get_stats(self, model):
+        if model not in self.models:
+            self.models[model] = {
+                "requests": 0,
+                "latency": None,
+                "error_rate": 0.0,
+                "consecutive_failures": 0,
+                "degraded_until": 0,
+                "quota_exhausted_until": 0,
+                "last_error": None
+            }
+        return self.models[model]
+    
+    def record_success(self, model, latency):
+        """
+        Record a successful request and its latency (seconds)
+        """
+        with self._lock:
+            stats = self._get_stats(model)
+            stats["requests"] += 1
+            stats["latency"] = latency if stats["latency"] is None else stats["latency"] * 0.8 + latency * 0.2
+            stats["error_rate"] = stats["error_rate"] * 0.8
+            stats["consecutive_failures"] = 0
+    
+    def record_failure(self, model, status_code=None, error_text=""):
+        """
+        Record a failed request and mark the model as degraded when it keeps failing.
+        Only failures of the model itself count (5xx, 404, empty responses, daily quota): a 408 or
+        a 429 from the per-minute limits concerns one key, and another key will do.
+        """
+        daily_quota = "per day" in (error_text or "").lower()
+        if status_code == 408 or (status_code == 429 and not daily_quota):
+            return
+        
+        with self._lock:
+            now = time.time()
+            stats = self._get_stats(model)
+            stats["requests"] += 1
+            stats["error_rate"] = stats["error_rate"] * 0.8 + 0.2
+            stats["consecutive_failures"] += 1
+            stats["last_error"] = f"HTTP {status_code}" if status_code else error_text[:100]
+            
+            if status_code == 404:
+                # Model not available (renamed or retired), no point retrying it for a while
+                stats["degraded_until"] = now + MODEL_QUOTA_COOLDOWN
+            elif status_code == 429:
+                # Daily quota for this model is gone on this key, likely on the others soon too
+                stats["quota_exhausted_until"] = now + MODEL_QUOTA_COOLDOWN
+            elif (stats["consecutive_failures"] >= MODEL_DEGRADED_FAILURES
+                  or (stats["requests"] >= 5 and stats["error_rate"] > MODEL_ERROR_RATE_THRESHOLD)):
+                # Degraded for a cool-down only, so the model gets traffic again afterwards
+                stats["degraded_until"] = now + MODEL_DEGRADED_COOLDOWN
+                stats["consecutive_failures"] = 0
+    
+    def is_degraded(self, model):
+        """
+        Check whether a model is currently marked as failing or out of quota
+        """
+        with self._lock:
+            stats = self._get_stats(model)
+            now = time.time()
+            return stats["degraded_until"] > now or stats["quota_exhausted_until"] > now
+    
+    def get_chain(self, stage, model):
+        """
+        Get the models to try for a stage: the requested model followed by the stage's
+        fallback chain, fastest first by recent latency, with degraded models moved to the end.
+        Fallbacks without a recorded latency yet keep their configured place ahead of measured ones,
+        so they get measured.
+        """
+        chain = []
+        for candidate in [model] + list(self.chains.get(stage, [])) + [FALLBACK_MODEL]:
+            if candidate and candidate not in chain:
+                chain.append(candidate)
+        
+        with self._lock:
+            latencies = {candidate: self._get_stats(candidate)["latency"] or 0 for candidate in chain}
+        
+        # The requested model stays first unless degraded; stable sort keeps the configured order on ties
+        return sorted(chain, key=lambda candidate: (self.is_degraded(candidate), candidate != model, latencies[candidate]))
+    
+    def get_status(self):
+        """
+        Get a copy of the per-model stats for display
+        """
+        with self._lock:
+            return {model: dict(stats) for model, stats in self.models.items()}
@@ -0,0 +1,215 @@
+import os
+import json
+import atexit
+import weakref
+import hashlib
+import datetime
+import threading
+from modules.settings import QUOTA_LEDGER_FILE, QUOTA_LEDGER_DAYS, MODEL_DAILY_LIMITS, DEFAULT_DAILY_LIMIT
+
+# Every client (one per app session) has its own ledger, so saves to the same file share a lock
+_file_locks = {}
+_file_locks_lock = threading.Lock()
+
+def _get_file_lock(path):
+    with _file_locks_lock:
+        return _file_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+# Live ledgers, flushed by a single exit handler (held weakly, so closed sessions' ledgers can be freed)
+_ledgers = weakref.WeakSet()
+
+def _flush_ledgers():
+    for ledger in list(_ledgers):
+        ledger.flush()
+
+atexit.register(_flush_ledgers)
+
+class QuotaLedger:
+    def __init__(self, state_file=QUOTA_LEDGER_FILE, limits=None):
+        """
+        Requests and tokens used per key, per model, per quota day, persisted across restarts.
+        Quota days follow Gemini's daily reset at midnight Pacific time.
+        Other ledgers may share the file, so saving adds this ledger's unsaved usage to the
+        file's current contents instead of overwriting them. Unsaved usage is flushed at exit.
+        """
+        self.state_file = state_file
+        self.limits = limits or MODEL_DAILY_LIMITS
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        
+        # Usage recorded since the last save: key id -> day -> model -> entry
+        self._deltas = {}
+        self.keys = self._load_state()
+        
+        _ledgers.add(self)
+    
+    def _load_state(self):
+        """
+        Load the ledger from the JSON file
+        """
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as file:
+                    return json.load(file)
+            except Exception as e:
+                print(f"Error loading quota ledger: {str(e)}")
+        return {}
+    
+    def _save_state(self):
+        """
+        Add the unsaved usage to the ledger on disk, which may include usage saved by other
+        ledgers, and adopt the result (written to a temp file first so a crash can't corrupt it)
+        """
+        with _get_file_lock(self.state_file):
+            keys = self._load_state()
+            for key_id, days in self._deltas.items():
+                for day, models in days.items():
+                    for model, delta in models.items():
+                        entry = keys.setdefault(key_id, {}).setdefault(day, {}).setdefault(
+                            model, {"requests": 0, "tokens": 0, "exhausted": False}
+                        )
+                        entry["requests"] += delta["requests"]
+                        entry["tokens"] += delta["tokens"]
+                        entry["exhausted"] = entry["exhausted"] or delta["exhausted"]
+            
+            # Drop the days we no longer need
+            for days in keys.values():
+                for day in sorted(days)[:-QUOTA_LEDGER_DAYS]:
+                    del days[day]
+            
+            try:
+                temp_file = f"{self.state_file}.tmp"
+                with open(temp_file, 'w', encoding='utf-8') as file:
+                    json.dump(keys, file, indent=2)
+                os.replace(temp_file, self.state_file)
+            except Exception as e:
+                print(f"Error saving quota ledger: {str(e)}")
+                return
+            
+            self.keys = keys
+            self._deltas = {}
+            self._unsaved = 0
+    
+    def _key_id(self, api_key):
+        """
+        Identify a key by a hash so the raw key is never written to the ledger file
+        """
+        return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+    
+    def _get_today(self):
+        """
+        Get the current quota day (date in Pacific time)
+        """
+        try:
+            from zoneinfo import ZoneInfo
+            return datetime.datetime.now(ZoneInfo("America/Los_Angeles")).date().isoformat()
+        except Exception:
+            return datetime.datetime.utcnow().date().isoformat()
+    
+    def _get_entry(self, api_key, model):
+        days = self.keys.setdefault(self._key_id(api_key), {})
+        today = self._get_today()
+        
+        if today not in days:
+            # New quota day, drop the days we no longer need
+            for day in sorted(days)[:max(0, len(days) - QUOTA_LEDGER_DAYS + 1)]:
+                del days[day]
+            days[today] = {}
+        
+        return days[today].setdefault(model, {"requests": 0, "tokens": 0, "exhausted": False})
+    
+    def _get_delta(self, api_key, model):
+        days = self._deltas.setdefault(self._key_id(api_key), {})
+        return days.setdefault(self._get_today(), {}).setdefault(model, {"requests": 0, "tokens": 0, "exhausted": False})
+    
+    def get_limit(self, model):
+        """
+        Get the daily request (rpd) and token (tpd) limits for a model, 0 meaning unlimited
+        """
+        return self.limits.get(model, DEFAULT_DAILY_LIMIT)
+    
+    def record_usage(self, api_key, model, tokens=0):
+        """
+        Record one request and the tokens it used (from usageMetadata)
+        """
+        with self._lock:
+            for entry in (self._get_entry(api_key, model), self._get_delta(api_key, model)):
+                entry["requests"] += 1
+                entry["tokens"] += max(0, tokens)
+            
+            # Usage changes on every request, so only rewrite the file every few of them
+            self._unsaved += 1
+            if self._unsaved >= 10:
+                self._save_state()
+    
+    def mark_exhausted(self, api_key, model):
+        """
+        Record that the server reported the key's daily quota for a model as used up
+        """
+        with self._lock:
+            self._get_entry(api_key, model)["exhausted"] = True
+            self._get_delta(api_key, model)["exhausted"] = True
+            self._save_state()
+    
+    def flush(self):
+        """
+        Save any usage recorded since the last save
+        """
+        with self._lock:
+            if self._deltas:
+                self._save_state()
+    
+    def get_remaining(self, api_key, model):
+        """
+        Get the fraction of the daily quota left for a key and model (the scarcer of requests and tokens)
+        """
+        with self._lock:
+            entry = dict(self._get_entry(api_key, model))
+        
+        if entry["exhausted"]:
+            return 0.0
+        
+        limit = self.get_limit(model)
+        remaining = 1.0
+        if limit.get("rpd"):
+            remaining = min(remaining, 1 - entry["requests"] / limit["rpd"])
+        if limit.get("tpd"):
+            remaining = min(remaining, 1 - entry["tokens"] / limit["tpd"])
+        return max(0.0, remaining)
+    
+    def is_exhausted(self, api_key, model, tokens=0, in_flight=0):
+        """
+        Check whether a key is projected to run out of daily quota for a model, counting the
+        requests already in flight on it and the tokens the next request is expected to use
+        """
+        with self._lock:
+            entry = dict(self._get_entry(api_key, model))
+        
+        if entry["exhausted"]:
+            return True
+        
+        limit = self.get_limit(model)
+        if limit.get("rpd") and entry["requests"] + in_flight + 1 > limit["rpd"]:
+            return True
+        if limit.get("tpd") and entry["tokens"] + tokens * (in_flight + 1) > limit["tpd"]:
+            return True
+        return False
+    
+    def get_status(self, api_key):
+        """
+        Get today's usage and remaining capacity per model for display
+        """
+        with self._lock:
+            today = self.keys.get(self._key_id(api_key), {}).get(self._get_today(), {})
+            usage = {model: dict(entry) for model, entry in today.items()}
+        
+        status = {}
+        for model in set(self.limits) | set(usage):
+            entry = usage.get(model, {"requests": 0, "tokens": 0, "exhausted": False})
+            limit = self.get_limit(model)
+            entry["remaining_requests"] = max(0, limit["rpd"] - entry["requests"]) if limit.get("rpd") else None
+            entry["remaining_tokens"] = max(0, limit["tpd"] - entry["tokens"]) if limit.get("tpd") else None
+            if entry["exhausted"]:
+                entry["remaining_requests"] = 0
+            status[model] = entry
+        return status
@@ -0,0 +1,122 @@
+import time
+import threading
+from modules.settings import MODEL_RATE_LIMITS, DEFAULT_RATE_LIMIT, RATE_LIMIT_PENALTY
+
+class TokenBucket:
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def _refill(self, now):
+        """
+        Add the tokens accumulated since the last update
+        """
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+            self.updated = now
+    
+    def wait_time(self, amount, now):
+        """
+        Get the number of seconds until the bucket holds the requested amount of tokens
+        """
+        self._refill(now)
+        
+        # Never ask for more than a full bucket, otherwise a large request would wait forever
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0
+        return (amount - self.tokens) / self.refill_per_second
+    
+    def consume(self, amount, now):
+        """
+        Take tokens from the bucket (the balance may go negative to record overuse)
+        """
+        self._refill(now)
+        self.tokens -= amount
+    
+    def drain(self, now):
+        """
+        Empty the bucket so the next request has to wait for a refill
+        """
+        self._refill(now)
+        self.tokens = min(self.tokens, 0)
+
+class RateLimiter:
+    def __init__(self, limits=None, default_limit=None):
+        self.limits = limits or MODEL_RATE_LIMITS
+        self.default_limit = default_limit or DEFAULT_RATE_LIMIT
+        self._lock = threading.Lock()
+        
+        # Buckets per (api_key, model) and the time until which a key/model pair is paused
+        self._buckets = {}
+        self._blocked_until = {}
+    
+    def _get_buckets(self, api_key, model):
+        """
+        Get (or create) the RPM and TPM buckets for a key and model
+        """
+        bucket_key = (api_key, model)
+        if bucket_key not in self._buckets:
+            limit = self.limits.get(model, self.default_limit)
+            self._buckets[bucket_key] = {
+                "rpm": TokenBucket(limit["rpm"], limit["rpm"] / 60.0),
+                "tpm": TokenBucket(limit["tpm"], limit["tpm"] / 60.0)
+            }
+        return self._buckets[bucket_key]
+    
+    def _wait_time_locked(self, api_key, model, tokens, now):
+        buckets = self._get_buckets(api_key, model)
+        blocked = max(0, self._blocked_until.get((api_key, model), 0) - now)
+        return max(
+            blocked,
+            buckets["rpm"].wait_time(1, now),
+            buckets["tpm"].wait_time(tokens, now)
+        )
+    
+    def wait_time(self, api_key, model, tokens=0):
+        """
+        Get the number of seconds a request on this key and model would have to wait
+        """
+        with self._lock:
+            return self._wait_time_locked(api_key, model, tokens, time.monotonic())
+    
+    def acquire(self, api_key, model, tokens=0):
+        """
+        Wait until the key has quota for one more request of the given size, then reserve it
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._wait_time_locked(api_key, model, tokens, now)
+                if wait <= 0:
+                    buckets = self._get_buckets(api_key, model)
+                    buckets["rpm"].consume(1, now)
+                    buckets["tpm"].consume(tokens, now)
+                    return
+            
+            # Sleep outside the lock so other keys can still be used meanwhile
+            time.sleep(wait)
+    
+    def record_tokens(self, api_key, model, tokens):
+        """
+        Charge additional tokens once the real usage of a request is known
+        """
+        if tokens <= 0:
+            return
+        
+        with self._lock:
+            self._get_buckets(api_key, model)["tpm"].consume(tokens, time.monotonic())
+    
+    def penalize(self, api_key, model, retry_after=None):
+        """
+        Pause a key/model pair after a 429 response.
+        Honors the server's Retry-After delay when one was given.
+        """
+        with self._lock:
+            now = time.monotonic()
+            delay = retry_after if retry_after is not None else RATE_LIMIT_PENALTY
+            self._blocked_until[(api_key, model)] = max(self._blocked_until.get((api_key, model), 0), now + delay)
+            self._get_buckets(api_key, model)["rpm"].drain(now)
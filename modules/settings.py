@@ -7,18 +7,168 @@ ARTICLE_LINKS_FILE = "article_links.json"  # File to store article links for int
 API_KEYS_FILE = "apikey.txt"  # File to store API keys
 
 # API settings
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"  # Gemini endpoint (can point at a local stub server)
 API_KEY_MIN_LENGTH = 25  # Minimum length for a valid API key
 DEFAULT_DOMAIN = "bloggers.web.id"  # Default domain if none provided
 
+# HTTP transport settings
+HTTP_POOL_CONNECTIONS = 10  # Connection pools kept per session
+HTTP_POOL_MAXSIZE = 20  # Keep-alive connections per host
+HTTP_MAX_SESSIONS = 64  # Hosts with an open session before the least recently used is closed
+HTTP_TIMEOUTS = {  # (connect, read) timeouts in seconds per kind of request
+    "default": (5, 30),
+    "gemini": (10, 120),
+    "llm": (10, 300),  # OpenAI-compatible backends (local servers can be slow to produce long articles)
+    "search": (5, 10),
+    "download": (5, 10)
+}
+DNS_CACHE_TTL = 300  # Seconds to cache DNS lookups (0 disables the cache)
+DNS_CACHE_MAX_ENTRIES = 256  # Hosts kept in the DNS cache before the least recently used are dropped
+
 # Article generation settings
 DEFAULT_PUBLISHER = "Mas DEEe"  # Default publisher name
 MAX_RETRIES = 5  # Maximum retries for API requests
 WAIT_TIME_BETWEEN_REQUESTS = 2  # Wait time between API requests (seconds)
 
+# Concurrency settings
+REQUESTS_PER_KEY = 1  # In-flight requests per API key (the starting window when ADAPTIVE_CONCURRENCY is on)
+MAX_CONCURRENT_ARTICLES = 0  # Articles generated in parallel in batch mode (0 = one per API key slot)
+
+# Adaptive concurrency: widen the in-flight windows while responses are healthy, halve them on 429s/timeouts
+ADAPTIVE_CONCURRENCY = True
+CONCURRENCY_MIN_PER_KEY = 1  # Smallest in-flight window per key
+CONCURRENCY_MAX_PER_KEY = 4  # Largest in-flight window per key
+CONCURRENCY_BACKOFF = 0.5  # Factor applied to a window after an overload signal
+
+# Hedged requests: duplicate slow requests on another idle key
+HEDGING_ENABLED = True  # Send a duplicate request when one is slower than usual
+HEDGE_PERCENTILE = 0.95  # Hedge once a request takes longer than this percentile of recent latencies
+HEDGE_MIN_SAMPLES = 20  # Latencies needed (per model and prompt size) before hedging starts
+HEDGE_MAX_EXTRA_RATIO = 0.1  # Hedge requests allowed, as a fraction of all requests sent
+HEDGE_HISTORY_SIZE = 200  # Recent latencies kept per model and prompt size
+HEDGE_MAX_WORKERS = 64  # Threads running hedged requests
+
+# Rate limits per API key and model (requests and tokens per minute)
+MODEL_RATE_LIMITS = {
+    "gemini-1.5-flash": {"rpm": 15, "tpm": 1000000},
+    "gemini-1.5-pro": {"rpm": 2, "tpm": 32000}
+}
+DEFAULT_RATE_LIMIT = {"rpm": 15, "tpm": 1000000}  # Limits for models not listed above
+RATE_LIMIT_PENALTY = 60  # Seconds a key/model is paused after a 429 without a Retry-After delay
+
+# Daily quota settings (per key; rpd = requests per day, tpd = tokens per day, 0 = unlimited)
+MODEL_DAILY_LIMITS = {
+    "gemini-1.5-flash": {"rpd": 1500, "tpd": 0},
+    "gemini-1.5-pro": {"rpd": 50, "tpd": 0}
+}
+DEFAULT_DAILY_LIMIT = {"rpd": 1500, "tpd": 0}  # Limits for models not listed above
+QUOTA_LEDGER_FILE = "apikey_usage.json"  # Daily usage per key, stored next to API_KEYS_FILE
+QUOTA_LEDGER_DAYS = 7  # Days of usage history kept in the ledger
+
+# API key health settings
+KEY_HEALTH_FILE = "apikey_health.json"  # Key health state, stored next to API_KEYS_FILE
+KEY_HEALTH_WINDOW = 600  # Window (seconds) for counting recent 429/403 errors
+KEY_HEALTH_429_THRESHOLD = 3  # 429s within the window before a key is quarantined
+KEY_QUARANTINE_BASE = 300  # First quarantine cool-down (seconds), doubled on each repeat
+KEY_QUARANTINE_MAX = 6 * 3600  # Longest cool-down for rate-limited keys (seconds)
+KEY_QUARANTINE_INVALID = 24 * 3600  # Cool-down for revoked or invalid keys (seconds)
+KEY_QUARANTINE_MAX_WAIT = 300  # Longest a request waits for a key to leave quarantine when all are quarantined (seconds)
+TITLE_BATCH_SIZE = 25  # Subjects per request when generating titles in batch mode
+SINGLE_CALL_GENERATION = False  # Generate title, slug and article with one structured (JSON) request
+SECTIONED_GENERATION = False  # Generate an outline, then write the H2 sections concurrently
+SECTION_COUNT = "6-7"  # Number of H2 sections requested in the outline
+
+# LLM backends, weighted by their share of requests. Add an OpenAI-compatible server with e.g.
+# {"type": "openai", "weight": 1, "base_url": "http://localhost:8000", "model": "llama-3.1-8b-instruct", "api_key": ""}
+LLM_BACKENDS = [
+    {"type": "gemini", "weight": 1}
+]
+
 # Model selection
 DEFAULT_TITLE_MODEL = "gemini-1.5-flash"  # Default model for title generation
 DEFAULT_ARTICLE_MODEL = "gemini-1.5-flash"  # Default model for article generation
 FALLBACK_MODEL = "gemini-1.5-flash"  # Fallback model if primary fails
+MODEL_CHAINS = {  # Models tried in order after the requested one, per generation stage
+    "title": ["gemini-1.5-flash"],
+    "article": ["gemini-1.5-flash"],
+    "outline": ["gemini-1.5-flash"],
+    "section": ["gemini-1.5-flash"]
+}
+MODEL_DEGRADED_FAILURES = 2  # Consecutive failures before switching to the next model in the chain
+MODEL_ERROR_RATE_THRESHOLD = 0.5  # Recent error rate above which a model is considered degraded
+MODEL_DEGRADED_COOLDOWN = 120  # Seconds a degraded model is tried last
+MODEL_QUOTA_COOLDOWN = 3600  # Seconds a model is tried last after a daily quota error or 404
+
+# Response cache settings
+RESPONSE_CACHE_ENABLED = True  # Reuse responses for identical prompts (model + prompt + generationConfig)
+RESPONSE_CACHE_FILE = "cache/responses.sqlite"  # SQLite file for cached Gemini responses
+RESPONSE_CACHE_TTL = 30 * 24 * 3600  # Seconds a cached response stays valid (0 = forever)
+RESPONSE_CACHE_MAX_BYTES = 500 * 1024 * 1024  # Size limit before least recently used responses are evicted
+
+# Streaming settings
+USE_STREAMING = False  # Stream article text and resolve images while the article is still being generated
+IMAGE_WORKERS = 4  # Worker threads resolving image placeholders
+PARALLEL_IMAGES = True  # Resolve all image placeholders of an article at once instead of one after another
+CONCURRENT_IMAGE_SEARCH = True  # Query Bing and Yahoo at the same time and stop once enough images arrive
+IMAGE_SEARCH_WORKERS = 8  # Threads running provider searches
+IMAGE_SEARCH_ENOUGH = 3  # Usable candidates after which outstanding searches are abandoned
+IMAGE_SEARCH_BUDGET = 20  # Seconds of searching allowed per image placeholder (0 = no limit)
+
+# Related articles settings
+RELATED_BM25_K1 = 1.2  # How quickly repeated keywords stop adding to an article's score
+RELATED_BM25_B = 0.75  # How much longer titles/subjects are penalized (0 = not at all, 1 = fully)
+RELATED_SUBJECT_WEIGHT = 2  # Subject keywords count this many times as much as title keywords
+RELATED_MAX_POSTINGS = 500  # Keywords in more articles than this only rescore articles matched by rarer keywords
+
+# Article links storage settings
+ARTICLE_LINKS_STORAGE = "jsonl"  # "jsonl" appends each new article to ARTICLE_LINKS_LOG_FILE, "json" rewrites ARTICLE_LINKS_FILE on every add
+ARTICLE_LINKS_LOG_FILE = "article_links.jsonl"  # Append-only log (ARTICLE_LINKS_FILE is imported into it once)
+ARTICLE_LINKS_COMPACT_EVERY = 1000  # Appends after which the log is rewritten without duplicate or damaged lines
+
+# Deferred image settings
+DEFER_IMAGES = False  # Save posts straight away and resolve their images on a background queue
+IMAGE_QUEUE_FILE = "cache/image_queue.sqlite"  # SQLite file holding queued image jobs (kept across restarts)
+IMAGE_QUEUE_WORKERS = 2  # Background threads resolving queued posts
+IMAGE_QUEUE_MAX_ATTEMPTS = 3  # Attempts per post before its job is marked failed
+IMAGE_QUEUE_POLL_INTERVAL = 30  # Seconds idle workers wait before checking the queue again
+IMAGE_QUEUE_STALE_AFTER = 1800  # Seconds after which a running job is assumed abandoned and claimed again
+
+# Image probing settings
+IMAGE_PROBE_ENABLED = True  # Check candidates' real type, size and dimensions before downloading
+IMAGE_PROBE_CANDIDATES = 4  # Search results probed in parallel per placeholder
+IMAGE_PROBE_BYTES = 64 * 1024  # Bytes fetched per probe (enough for the headers holding the dimensions)
+IMAGE_MAX_BYTES = 5 * 1024 * 1024  # Candidates larger than this are skipped and downloads past it aborted
+IMAGE_MIN_WIDTH = 400  # Narrower images are only used when nothing larger is available
+
+# Image optimization settings (requires Pillow)
+IMAGE_OPTIMIZE_ENABLED = True  # Resize downloaded images and add WebP/JPEG variants
+IMAGE_WIDTHS = [480, 800, 1200]  # Variant widths in pixels (images are never upscaled)
+IMAGE_WEBP_QUALITY = 80  # WebP encoding quality (0-100)
+IMAGE_JPEG_QUALITY = 82  # JPEG encoding quality (0-100)
+IMAGE_OPTIMIZE_WORKERS = 2  # Processes encoding images
+IMAGE_VARIANTS_FILE = "cache/image_variants.jsonl"  # Manifest of optimized images (kept outside IMAGES_FOLDER so writing it doesn't change the folder mtime)
+
+# Assets index settings
+ASSETS_INDEX_FILE = "cache/assets_index.json"  # Index of existing images (kept outside IMAGES_FOLDER so saving it doesn't change the folder mtime)
+ASSETS_INDEX_SAVE_EVERY = 50  # New images recorded before the index file is rewritten
+ASSETS_INDEX_RESCAN_INTERVAL = 3600  # Seconds between full rescans that pick up changes the folder mtime missed
+
+# Image store settings
+IMAGE_STORE_ENABLED = True  # Keep each downloaded image once (by content hash) and link it under its SEO filename
+IMAGE_STORE_FOLDER = "cache/image_store"  # Store folder, kept outside IMAGES_FOLDER so it is never published
+
+# Image search providers
+IMAGE_PROVIDERS = ["bing", "yahoo"]  # Registered providers used for searches, in order of preference
+IMAGE_PROVIDER_RESULTS = 5  # Image URLs taken from each results page
+IMAGE_PROVIDER_MAX_MATCH = 8192  # Longest expected match (characters) when scanning results pages in chunks
+IMAGE_PROVIDER_FAILURE_THRESHOLD = 5  # Consecutive errors or empty pages before a provider is skipped
+IMAGE_PROVIDER_COOLDOWN = 300  # Seconds a failing provider is skipped before it is tried again
+
+# Image search cache settings
+IMAGE_SEARCH_CACHE_ENABLED = True  # Reuse Bing/Yahoo results for queries searched before
+IMAGE_SEARCH_CACHE_FILE = "cache/image_search.sqlite"  # SQLite file for cached search results
+IMAGE_SEARCH_CACHE_TTL = 7 * 24 * 3600  # Seconds cached search results stay valid (0 = forever)
+IMAGE_SEARCH_CACHE_MAX_BYTES = 20 * 1024 * 1024  # Size limit before least recently used queries are evicted
 
 # Images settings
 MAX_IMAGES_PER_ARTICLE = 7  # Maximum number of images per article
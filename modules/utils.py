@@ -7,7 +7,7 @@ import datetime
 from slugify import slugify
 from langdetect import detect
 from langcodes import Language
-import requests
+from modules.http_transport import get_transport
 from modules.settings import API_KEYS_FILE, API_KEY_MIN_LENGTH
 
 def validate_api_key(api_key):
@@ -67,20 +67,28 @@ def generate_permalink(title):
     """
     return f"/{slugify(title)}"
 
+# Common words to exclude from tags and keywords (both English and Indonesian)
+STOP_WORDS = {
+    'yang', 'untuk', 'dengan', 'adalah', 'dari', 'cara', 'tips', 'trik',
+    'dan', 'atau', 'jika', 'maka', 'namun', 'tetapi', 'juga', 'oleh',
+    'the', 'and', 'that', 'this', 'with', 'for', 'from', 'how', 'what',
+    'when', 'why', 'where', 'who', 'will', 'your', 'their', 'our', 'its'
+}
+
+def extract_keywords(text):
+    """
+    Split text into keywords: lowercased, without punctuation and stop words (duplicates are kept).
+    Unlike tags, short words are kept, since they are often the key term ("SEO", "AI", "PHP").
+    """
+    clean_text = text.lower().replace(':', ' ').replace('-', ' ').replace(',', ' ').replace('.', ' ')
+    return [word for word in clean_text.split() if word not in STOP_WORDS]
+
 def generate_tags_from_title(title, subject):
     """
     Generate SEO-optimized tags from the title and subject of the article.
     This function uses title words as primary source for tags and supplements with subject words.
     It prioritizes longer phrases as they tend to be more specific keywords.
     """
-    # Common words to exclude (both English and Indonesian)
-    stop_words = [
-        'yang', 'untuk', 'dengan', 'adalah', 'dari', 'cara', 'tips', 'trik',
-        'dan', 'atau', 'jika', 'maka', 'namun', 'tetapi', 'juga', 'oleh',
-        'the', 'and', 'that', 'this', 'with', 'for', 'from', 'how', 'what',
-        'when', 'why', 'where', 'who', 'will', 'your', 'their', 'our', 'its'
-    ]
-    
     # Clean and normalize text
     clean_title = title.lower().replace(':', ' ').replace('-', ' ').replace(',', ' ').replace('.', ' ')
     clean_subject = subject.lower()
@@ -92,22 +100,22 @@ def generate_tags_from_title(title, subject):
     # Get 2-word phrases
     for i in range(len(title_parts) - 1):
         phrase = title_parts[i] + ' ' + title_parts[i + 1]
-        if all(word not in stop_words for word in phrase.split()):
+        if all(word not in STOP_WORDS for word in phrase.split()):
             title_phrases.append(phrase)
     
     # Get 3-word phrases
     for i in range(len(title_parts) - 2):
         phrase = title_parts[i] + ' ' + title_parts[i + 1] + ' ' + title_parts[i + 2]
-        if all(word not in stop_words for word in phrase.split()):
+        if all(word not in STOP_WORDS for word in phrase.split()):
             title_phrases.append(phrase)
     
     # Get single words from title
     title_words = [word.strip() for word in clean_title.split() 
-                 if len(word.strip()) > 3 and word.lower() not in stop_words]
+                 if len(word.strip()) > 3 and word.lower() not in STOP_WORDS]
     
     # Get words from subject
     subject_words = [word.strip() for word in clean_subject.split() 
-                    if len(word.strip()) > 3 and word.lower() not in stop_words]
+                    if len(word.strip()) > 3 and word.lower() not in STOP_WORDS]
     
     # Build final tag list prioritizing multi-word phrases
     all_tags = []
@@ -179,13 +187,33 @@ def get_html_content(url, headers=None):
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
     
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = get_transport().get(url, kind="search", headers=headers)
         response.raise_for_status()
         return response.text
     except Exception as e:
         print(f"Error fetching URL {url}: {str(e)}")
         return None
 
+def parse_json_response(text):
+    """
+    Parse JSON returned by the model, tolerating markdown code fences around it.
+    Returns None if the text isn't valid JSON.
+    """
+    if not text:
+        return None
+    
+    cleaned = text.strip()
+    
+    # Strip ```json ... ``` fences the model sometimes adds even in JSON mode
+    fence_match = re.match(r'^```(?:json)?\s*(.*?)\s*```$', cleaned, re.DOTALL)
+    if fence_match:
+        cleaned = fence_match.group(1)
+    
+    try:
+        return json.loads(cleaned)
+    except ValueError:
+        return None
+
 def read_subjects_file(filename="subjects.txt"):
     """
     Read subjects from the subjects.txt file